@@ -0,0 +1,95 @@
+"""
+Measure opening the assets of a style cold, from the loose files and from
+its asset pack.
+
+Each run opens every layer of the style and builds its card templates in a
+fresh interpreter, as the first card of a run or of a render worker does.
+The pack is built in a temporary directory, and its layers are checked to
+be the decoded loose files pixel for pixel.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+
+SCRIPT = """
+import json
+from time import perf_counter
+from util import BLEND_COLORS, ImageUtil
+from pack import AssetPack
+start = perf_counter()
+if {directory!r}:
+    ImageUtil().load_pack({style!r}, {directory!r})
+for filename in AssetPack.sources({style!r}):
+    ImageUtil().open_layer(filename)
+for rarity in BLEND_COLORS:
+    ImageUtil().card_template({style!r}, rarity)
+print(json.dumps({{"seconds": perf_counter() - start, "packed": len(ImageUtil.packs)}}))
+"""
+
+
+def measure(style: str, directory: str, runs: int) -> float:
+    """Return the median time to open the assets of the style in a fresh interpreter."""
+    times = []
+
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(style=style, directory=directory)],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout
+        result = json.loads(output)
+
+        if bool(result["packed"]) != bool(directory):
+            sys.exit(f"Asset pack of {style} not opened")
+
+        times.append(result["seconds"])
+
+    return statistics.median(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--style", action="append", help="styles to open, every one by default")
+    parser.add_argument("--runs", type=int, default=5, help="interpreters per style")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+
+    from PIL import Image
+
+    from pack import AssetPack
+    from util import BLEND_COLORS
+
+    directory = tempfile.mkdtemp(prefix="athena-packs-")
+    styles = args.style or sorted(
+        entry.name for entry in os.scandir("assets/images") if entry.is_dir())
+
+    for style in styles:
+        path = os.path.join(directory, f"{style}.pack")
+        AssetPack.build(style, path, BLEND_COLORS)
+
+        pack = AssetPack.open(path, style, BLEND_COLORS)
+        for filename, source in AssetPack.sources(style).items():
+            with Image.open(source) as image:
+                if image.convert("RGBA").tobytes() != pack.layer(filename).tobytes():
+                    sys.exit(f"{filename} differs in the asset pack of {style}")
+
+        loose = measure(style, "", args.runs)
+        packed = measure(style, directory, args.runs)
+        print(
+            f"{style}: {loose * 1000:.0f} ms loose, {packed * 1000:.0f} ms packed, "
+            f"{os.path.getsize(path) / 1024 / 1024:.1f} MB pack"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compare two benchmark results files, run by run.
+
+    python benchmarks/compare.py results/before.json results/after.json
+"""
+import argparse
+import json
+
+
+def rows(results: dict) -> dict:
+    """Return the measurements of every fixture run, keyed by (fixture, run)."""
+    measurements = {}
+
+    for fixture in results["fixtures"]:
+        for index, run in enumerate(fixture["runs"]):
+            values = {
+                "wall": run["wall"],
+                "cpu": run["cpu"],
+                "peak_rss_kb": run["peak_rss_kb"],
+                "output_bytes": run["output_bytes"],
+            }
+            for stage, totals in run["stages"].items():
+                values[f"{stage} wall"] = totals["wall"]
+                values[f"{stage} peak"] = totals.get("peak_rss_kb")
+
+            measurements[(fixture["fixture"], index + 1)] = values
+
+    return measurements
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before, "r") as file:
+        before = rows(json.load(file))
+    with open(args.after, "r") as file:
+        after = rows(json.load(file))
+
+    for key in sorted(before.keys() & after.keys()):
+        print(f"{key[0]} run {key[1]}")
+
+        for name, old in before[key].items():
+            new = after[key].get(name)
+            if not old or new is None:
+                continue
+
+            print(f"  {name:<24} {old:>14,.2f} {new:>14,.2f} {((new - old) / old):>+8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Compare the PIL and NumPy compositors on the fixture shops.
+
+Both render the same Item Shop from the same decoded icons, the time spent
+generating the cards and in the whole image is reported for each, and the
+images are compared pixel by pixel. Exits with status 1 when they differ by
+more than the tolerance.
+"""
+import argparse
+import os
+import statistics
+import sys
+from time import perf_counter
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCHMARKS)
+
+
+def render(athena, item_shop: dict, compositor) -> tuple:
+    """Return the (wall time, stages, image) of generating the Item Shop image."""
+    from io import BytesIO
+
+    from PIL import Image
+
+    from metrics import metrics
+
+    athena.compositor = compositor
+    metrics.reset()
+
+    start = perf_counter()
+    athena.generate_image("Monday, January 4, 2021", item_shop)
+    wall = perf_counter() - start
+
+    image = Image.open(BytesIO(athena.output_data))
+    image.load()
+    return wall, metrics.summary()["stages"], image
+
+
+def difference(first, second) -> tuple:
+    """Return the largest channel difference and the count of differing pixels."""
+    from PIL import ImageChops
+
+    diff = ImageChops.difference(first, second)
+    largest = max(high for _, high in diff.getextrema())
+    differing = sum(diff.convert("L").point(lambda v: 255 if v else 0).histogram()[1:])
+    return largest, differing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--fixture",
+        action="append",
+        choices=["small", "typical", "huge"],
+        help="fixture shops to render, small and typical by default",
+    )
+    parser.add_argument("--style", action="append", choices=["old", "new"])
+    parser.add_argument("--runs", type=int, default=3, help="renders per compositor")
+    parser.add_argument(
+        "--tolerance", type=int, default=0, help="largest channel difference allowed")
+    args = parser.parse_args()
+
+    from server import isolate, serving
+
+    isolate("athena-compositor-", {"CACHE_DIRECTORY": "", "PNG_COMPRESS_LEVEL": 1})
+
+    from compositor import Compositor
+    from itemshop import Athena
+    from configuration import Config
+
+    matching = True
+
+    for fixture in args.fixture or ["small", "typical"]:
+        with serving(fixture) as server:
+            for style in args.style or ["old", "new"]:
+                Config.STYLE = style
+                athena = Athena()
+                athena.shop_url = server.shop_url
+                item_shop = athena.fetch_shop()
+
+                # Downloads the icons and warms up the asset caches
+                render(athena, item_shop, None)
+
+                results = {"pil": [], "numpy": []}
+                images = {}
+                for _ in range(args.runs):
+                    for name, compositor in (("pil", None), ("numpy", Compositor())):
+                        wall, stages, images[name] = render(athena, item_shop, compositor)
+                        cards = stages.get("generate_card", {}).get("seconds", 0.0)
+                        results[name].append((wall, cards))
+
+                for name, runs in results.items():
+                    print(
+                        f"{fixture} {style} {name}: "
+                        f"{statistics.median(wall for wall, _ in runs):.2f}s image, "
+                        f"{statistics.median(cards for _, cards in runs):.2f}s cards"
+                    )
+
+                largest, differing = difference(images["pil"], images["numpy"])
+                print(f"{fixture} {style}: {differing:,} pixels differ, by {largest} at most")
+
+                if largest > args.tolerance:
+                    matching = False
+
+    if not matching:
+        print(f"Compositors differ by more than {args.tolerance}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measure downscaling the icons served by the stand-in server to the boxes of
+the cards.
+
+Every size of icon is decoded and resized to each box, the median time is
+reported. The icons are also resized once converted to the other modes
+Athena may be served, palette and bilevel included, and must come out at
+the size of the box, in their own mode unless converted to RGBA. Exits
+with status 1 when a check fails.
+"""
+import argparse
+import os
+import statistics
+import sys
+from io import BytesIO
+from time import perf_counter
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCHMARKS)
+
+# Boxes the icons are resized to by Athena.card_layers, and their RGBA conversion
+BOXES = [(285, 365, True), (230, 310, True), (310, 390, True), (75, 75, False)]
+
+MODES = ["P", "1", "L", "LA", "RGB", "RGBA"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="resizes per icon and box")
+    args = parser.parse_args()
+
+    from PIL import Image
+
+    from server import ICON_SIZES, render_icon
+    from util import ImageUtil
+
+    passed = True
+
+    def check(condition: bool, message: str) -> None:
+        nonlocal passed
+
+        if not condition:
+            print(f"FAILED: {message}")
+            passed = False
+
+    for filename, size in ICON_SIZES.items():
+        content = render_icon(f"/images/cosmetics/br/benchmark/{filename}")
+
+        for width, height, rgba in BOXES:
+            times = []
+            for _ in range(args.runs):
+                start = perf_counter()
+                ImageUtil().downscale_icon(content, width, height, rgba)
+                times.append(perf_counter() - start)
+
+            print(
+                f"{size}px to {width}x{height}: "
+                f"{statistics.median(times) * 1000:.1f} ms"
+            )
+
+        for mode in MODES:
+            buffer = BytesIO()
+            Image.open(BytesIO(content)).convert(mode).save(buffer, "PNG")
+
+            for width, height, rgba in BOXES:
+                try:
+                    icon = ImageUtil().downscale_icon(buffer.getvalue(), width, height, rgba)
+                except Exception as error:
+                    check(False, f"{size}px {mode} icon to {width}x{height}, {error}")
+                    continue
+
+                ratio = max(width / size, height / size)
+                expected = (int(size * ratio), int(size * ratio))
+                check(
+                    icon.size == expected and icon.mode == ("RGBA" if rgba else mode),
+                    f"{size}px {mode} icon to {width}x{height} came out "
+                    f"{icon.mode} {icon.size[0]}x{icon.size[1]}",
+                )
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the classic and packed layouts on the fixture shops.
+
+Both render the same Item Shop from the same decoded icons, the size of the
+image, the pixels saved by the packed layout and the time spent encoding the
+image are reported for each.
+"""
+import argparse
+import os
+import statistics
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCHMARKS)
+
+
+def render(athena, item_shop: dict, layout: str) -> tuple:
+    """Return the (encode time, image pixels, image bytes) of generating the Item Shop image."""
+    from io import BytesIO
+
+    from PIL import Image
+
+    from metrics import metrics
+
+    athena.layout = layout
+    metrics.reset()
+
+    athena.generate_image("Monday, January 4, 2021", item_shop)
+
+    image = Image.open(BytesIO(athena.output_data))
+    encode = metrics.summary()["stages"].get("encode", {}).get("seconds", 0.0)
+    return encode, image.width * image.height, len(athena.output_data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--fixture",
+        action="append",
+        choices=["small", "typical", "huge"],
+        help="fixture shops to render, every one by default",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="renders per layout")
+    parser.add_argument("--columns", type=int, help="LAYOUT_COLUMNS of the packed layout")
+    parser.add_argument("--max-width", type=int, help="LAYOUT_MAX_WIDTH of the packed layout")
+    args = parser.parse_args()
+
+    from server import isolate, serving
+
+    overrides = {"CACHE_DIRECTORY": ""}
+    if args.columns is not None:
+        overrides["LAYOUT_COLUMNS"] = args.columns
+    if args.max_width is not None:
+        overrides["LAYOUT_MAX_WIDTH"] = args.max_width
+
+    isolate("athena-layout-", overrides)
+
+    from itemshop import Athena
+
+    for fixture in args.fixture or ["small", "typical", "huge"]:
+        with serving(fixture) as server:
+            athena = Athena()
+            athena.shop_url = server.shop_url
+            item_shop = athena.fetch_shop()
+
+            # Downloads the icons and warms up the asset caches
+            render(athena, item_shop, "packed")
+
+            results = {}
+            for layout in ("classic", "packed"):
+                runs = [render(athena, item_shop, layout) for _ in range(args.runs)]
+                results[layout] = runs[-1][1]
+
+                print(
+                    f"{fixture} {layout}: {runs[-1][1]:,} pixels, "
+                    f"{statistics.median(encode for encode, _, _ in runs):.2f}s encode, "
+                    f"{runs[-1][2] / 1024:,.0f} KB"
+                )
+
+            print(f"{fixture}: {results['classic'] - results['packed']:,} pixels saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Generate the Item Shop fixtures used by the benchmarks.
+
+The fixtures follow the schema of the fortnite-api.com combined shop
+endpoint, icon urls start with `{cdn}` which the stand-in server replaces
+with its own address.
+"""
+import json
+import os
+import random
+
+RARITIES = [
+    "common", "uncommon", "rare", "epic", "legendary", "marvel", "dc",
+    "icon", "frozen", "lava", "dark", "shadow", "starwars", "slurp",
+]
+TYPES = ["outfit", "emote", "wrap", "pickaxe", "glider", "backpack", "music"]
+WORDS = [
+    "Midas", "Drift", "Raven", "Lynx", "Skull", "Trooper", "Aura", "Crystal",
+    "Peely", "Meowscles", "Jonesy", "Renegade", "Raider", "Galaxy", "Ikonik",
+    "Calamity", "Ragnarok", "Omega", "Carbide", "Black", "Knight", "Reaper",
+    "Sparkle", "Specialist", "Dark", "Bomber", "Tactical", "Santa", "Neon",
+]
+
+# Name of the fixture: (featured, daily, specialFeatured) entry counts
+SIZES = {
+    "small": (6, 6, 0),
+    "typical": (24, 12, 0),
+    "huge": (90, 30, 24),
+}
+
+
+def cosmetic(rng: random.Random, index: int) -> dict:
+    """Return a cosmetic in the format of the shop endpoint."""
+    cosmetic_id = f"cid_{index:04d}_athena_commando"
+    rarity = rng.choice(RARITIES)
+    kind = rng.choice(TYPES)
+    name = " ".join(rng.choice(WORDS) for _ in range(rng.choice([1, 1, 2, 3])))
+
+    return {
+        "id": cosmetic_id,
+        "name": name,
+        "description": f"{name} is ready for battle.",
+        "type": {"value": kind, "displayValue": kind.capitalize(), "backendValue": kind},
+        "rarity": {"value": rarity, "displayValue": rarity.capitalize(), "backendValue": rarity},
+        "series": None,
+        "set": None,
+        "introduction": {"chapter": "2", "season": "5", "text": "Introduced in Chapter 2, Season 5.", "backendValue": 15},
+        "images": {
+            "smallIcon": f"{{cdn}}/images/cosmetics/br/{cosmetic_id}/smallicon.png",
+            "icon": f"{{cdn}}/images/cosmetics/br/{cosmetic_id}/icon.png",
+            "featured": (
+                f"{{cdn}}/images/cosmetics/br/{cosmetic_id}/featured.png"
+                if rng.random() < 0.6 else None
+            ),
+            "other": None,
+        },
+        "variants": None,
+        "gameplayTags": ["Cosmetics.Source.ItemShop", f"Cosmetics.Type.{kind}"],
+        "showcaseVideo": None,
+        "displayAssetPath": None,
+        "definitionPath": None,
+        "path": f"Athena/Items/Cosmetics/{cosmetic_id}",
+        "added": "2021-01-01T00:00:00Z",
+        "shopHistory": ["2021-01-01T00:00:00Z"],
+    }
+
+
+def entry(rng: random.Random, index: int) -> dict:
+    """Return a shop entry with an optional bundle of extra cosmetics."""
+    extras = rng.choice([0, 0, 0, 0, 1, 2, 3, 5])
+    items = [cosmetic(rng, (index * 10) + i) for i in range(extras + 1)]
+    price = rng.choice([200, 300, 500, 800, 1200, 1500, 2000, 2800])
+    bundle = None
+
+    if extras > 2 and rng.random() < 0.5:
+        bundle = {
+            "name": f"{items[0]['name']} Bundle",
+            "info": f"{extras + 1} items",
+            "image": f"{{cdn}}/images/bundles/bundle_{index:04d}.png",
+        }
+
+    return {
+        "regularPrice": price,
+        "finalPrice": price if bundle is None else price * 2,
+        "bundle": bundle,
+        "banner": None,
+        "giftable": True,
+        "refundable": True,
+        "sortPriority": 0,
+        "categories": [],
+        "devName": f"[VIRTUAL]1 x {items[0]['name']} for {price} MtxCurrency",
+        "offerId": f"v2:/{index:064x}",
+        "displayAssetPath": None,
+        "newDisplayAssetPath": None,
+        "items": items,
+    }
+
+
+def section(rng: random.Random, name: str, count: int, start: int):
+    if count == 0:
+        return None
+    return {
+        "name": name,
+        "entries": [entry(rng, start + i) for i in range(count)],
+    }
+
+
+def shop(name: str) -> dict:
+    """Return the fixture of the specified size."""
+    rng = random.Random(name)
+    featured, daily, special = SIZES[name]
+
+    return {
+        "status": 200,
+        "data": {
+            "hash": f"{name}0000",
+            "date": "2021-01-04T00:00:00Z",
+            "vbuckIcon": "{cdn}/images/vbuck.png",
+            "featured": section(rng, "Featured", featured, 0),
+            "daily": section(rng, "Daily", daily, 1000),
+            "specialFeatured": section(rng, "Special Featured", special, 2000),
+            "specialDaily": None,
+            "votes": None,
+            "voteWinners": None,
+        },
+    }
+
+
+if __name__ == "__main__":
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+    for name in SIZES:
+        with open(os.path.join(directory, f"{name}.json"), "w") as file:
+            json.dump(shop(name), file)
+            file.write("\n")
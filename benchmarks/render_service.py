@@ -0,0 +1,127 @@
+"""
+Render the fixture shops with several overlapping requests to a local
+render service.
+
+Every fixture is first rendered while the stand-in server answers the
+icons with HTTP 503: each of the overlapping renders must retry exactly
+`--retry-budget` times, its own retry budget, however they overlap. The
+fixture is then rendered `--rounds` times, the latency of the renders is
+reported and every render must succeed. Exits with status 1 when a check
+fails.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+from time import perf_counter
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCHMARKS)
+
+
+def post_renders(url: str, shop: dict, count: int) -> list:
+    """Post `count` overlapping renders of the provided shop, return their (status, seconds)."""
+    import requests
+
+    results = [None] * count
+    # Released together, so that the renders overlap
+    barrier = threading.Barrier(count)
+
+    def post(index: int) -> None:
+        barrier.wait()
+        start = perf_counter()
+        res = requests.post(f"{url}/image", json={"shop": shop}, timeout=300)
+        results[index] = (res.status_code, perf_counter() - start)
+
+    threads = [threading.Thread(target=post, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--fixture",
+        action="append",
+        choices=["small", "typical", "huge"],
+        help="fixture shops to render, small and typical by default",
+    )
+    parser.add_argument("--concurrency", type=int, default=2, help="overlapping renders")
+    parser.add_argument("--rounds", type=int, default=3, help="rounds of renders per fixture")
+    parser.add_argument("--retry-budget", type=int, default=3, help="retries of every render")
+    args = parser.parse_args()
+
+    from server import isolate, serving
+
+    isolate("athena-service-", {
+        "SERVICE_WORKERS": args.concurrency,
+        "HTTP_RETRIES": 1,
+        "HTTP_RETRY_BUDGET": args.retry_budget,
+    })
+
+    from metrics import metrics
+    from service import RenderService
+
+    passed = True
+
+    def check(condition: bool, message: str) -> None:
+        nonlocal passed
+
+        if not condition:
+            print(f"FAILED: {message}")
+            passed = False
+
+    service = RenderService("127.0.0.1", 0, args.concurrency, 300)
+    threading.Thread(target=service.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{service.server_address[1]}"
+
+    for fixture in args.fixture or ["small", "typical"]:
+        with serving(fixture) as server:
+            # HTTP 503 (Service Unavailable), retried until out of budget
+            server.icon_status = 503
+            metrics.reset()
+
+            results = post_renders(url, server.shop, args.concurrency)
+            retries = metrics.summary()["counters"].get("http_retries", 0)
+            print(f"{fixture}: {retries} retries by {args.concurrency} failing renders")
+
+            check(
+                all(status == 200 for status, _ in results),
+                "render with failing icons did not fall back to placeholders",
+            )
+            check(
+                retries == args.concurrency * args.retry_budget,
+                f"expected {args.concurrency * args.retry_budget} retries, "
+                "overlapping renders share their retry budget",
+            )
+
+            server.icon_status = 200
+            times = []
+
+            for _ in range(args.rounds):
+                results = post_renders(url, server.shop, args.concurrency)
+                times += [seconds for _, seconds in results]
+
+                check(all(status == 200 for status, _ in results), "render failed")
+
+            print(
+                f"{fixture}: {len(times)} renders, {statistics.median(times):.2f}s median, "
+                f"{max(times):.2f}s slowest"
+            )
+
+    service.shutdown()
+    service.server_close()
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Benchmark the Item Shop generation against a local stand-in server.
+
+Every fixture is measured in its own process, from an empty working
+directory, and the results are written as JSON so that runs can be compared
+with `compare.py`.
+"""
+import argparse
+import ast
+import functools
+import inspect
+import json
+import mmap
+import os
+import platform
+import subprocess
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter, process_time, sleep, strftime, thread_time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCHMARKS)
+
+
+def resident_kb(pid: str) -> int:
+    """Return the resident memory of the specified process in KB."""
+    with open(f"/proc/{pid}/statm", "r") as file:
+        return int(file.read().split()[1]) * mmap.PAGESIZE // 1024
+
+
+def children_kb() -> int:
+    """
+    Return the total resident memory of the children of this process in KB,
+    such as the card rendering processes.
+    """
+    parent = str(os.getpid())
+    total = 0
+
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+
+        try:
+            with open(f"/proc/{pid}/stat", "r") as file:
+                # After the name, which may contain spaces: state, parent pid
+                ppid = file.read().rsplit(")", 1)[1].split()[1]
+
+            if ppid == parent:
+                total += resident_kb(pid)
+        except (OSError, IndexError, ValueError):
+            # Exited meanwhile
+            continue
+
+    return total
+
+
+class StageTimer:
+    """
+    Accumulate the wall and CPU time spent in the wrapped functions, and the
+    peak resident memory of this process and of its children while they
+    run. Memory is sampled every `interval` seconds and, for this process
+    only, when a stage starts and ends. It is read from /proc, and left
+    None where it is not available.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.stages = {}
+        self.running = Counter()
+        self.lock = threading.Lock()
+        self.interval = interval
+        self.children = 0
+
+        threading.Thread(target=self.sample_forever, daemon=True).start()
+
+    def wrap(self, owner, name: str, stage: str) -> None:
+        """Replace `owner.name` with a timed version recorded under `stage`."""
+        original = inspect.getattr_static(owner, name)
+        static = isinstance(original, staticmethod)
+        function = original.__func__ if static else original
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            with self.timed(stage):
+                return function(*args, **kwargs)
+
+        setattr(owner, name, staticmethod(timed) if static else timed)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Record the wrapped block under `stage`."""
+        with self.lock:
+            self.running[stage] += 1
+        self.sample()
+
+        start, cpu = perf_counter(), thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = perf_counter() - start, thread_time() - cpu
+            self.sample()
+
+            with self.lock:
+                self.running[stage] -= 1
+
+                totals = self.totals(stage)
+                totals["calls"] += 1
+                totals["wall"] += wall
+                totals["cpu"] += cpu
+
+    def totals(self, stage: str) -> dict:
+        """Return the totals of the provided stage, with the lock held."""
+        return self.stages.setdefault(stage, {
+            "calls": 0,
+            "wall": 0.0,
+            "cpu": 0.0,
+            "peak_rss_kb": None,
+            "children_peak_rss_kb": None,
+        })
+
+    def sample(self, children: bool = False) -> None:
+        """
+        Record the current memory as the peak of the running stages it
+        exceeds. The children, costlier to find, are only measured again
+        when `children` is True.
+        """
+        try:
+            rss = resident_kb("self")
+
+            if children:
+                self.children = children_kb()
+        except OSError:
+            return
+
+        with self.lock:
+            for stage, count in self.running.items():
+                if count == 0:
+                    continue
+
+                totals = self.totals(stage)
+                totals["peak_rss_kb"] = max(totals["peak_rss_kb"] or 0, rss)
+                totals["children_peak_rss_kb"] = max(
+                    totals["children_peak_rss_kb"] or 0, self.children)
+
+    def sample_forever(self) -> None:
+        while True:
+            sleep(self.interval)
+
+            if any(self.running.values()):
+                self.sample(children=True)
+
+    def collect(self) -> dict:
+        """Return and reset the recorded stages."""
+        with self.lock:
+            stages, self.stages = self.stages, {}
+        return stages
+
+
+def measure(fixture: str, latency: float, runs: int, overrides: dict) -> dict:
+    """Generate the fixture shop `runs` times and return the measurements."""
+    from server import isolate, serving
+
+    isolate("athena-benchmark-", overrides, record=True)
+
+    import fetcher
+    from configuration import Config
+    from encoder import Encoder, PNGWriter
+    from itemshop import Athena
+    from metrics import metrics
+    from util import ImageUtil
+
+    timer = StageTimer()
+    # Called by fetcher.fetch_shops through the module, rather than by Athena
+    timer.wrap(fetcher, "fetch_shop", "fetch_shop")
+    timer.wrap(Athena, "generate_image", "generate_image")
+    timer.wrap(Athena, "generate_card_batch", "generate_card")
+    timer.wrap(ImageUtil, "download_image", "download_image")
+    timer.wrap(ImageUtil, "download_file", "download_file")
+    timer.wrap(Encoder, "encode", "save")
+    timer.wrap(PNGWriter, "write", "save")
+
+    with serving(fixture, latency) as server:
+        athena = Athena()
+        athena.shop_url = server.shop_url
+
+        results = []
+        for _ in range(runs):
+            server.requests = 0
+            metrics.reset()
+            start, cpu = perf_counter(), process_time()
+
+            with timer.timed("run"):
+                saved = athena.publish_all(athena.fetch_shops())
+
+            wall, cpu = perf_counter() - start, process_time() - cpu
+            stages = timer.collect()
+            run = stages.pop("run")
+
+            results.append({
+                "saved": saved,
+                "wall": wall,
+                "cpu": cpu,
+                "peak_rss_kb": run["peak_rss_kb"],
+                "children_peak_rss_kb": run["children_peak_rss_kb"],
+                "output_bytes": len(athena.output_data or b""),
+                "requests": server.requests,
+                "stages": stages,
+                "metrics": metrics.summary(),
+            })
+
+    return {
+        "fixture": fixture,
+        "latency": latency,
+        "config": {
+            key: value for key, value in vars(Config).items() if key.isupper()
+        },
+        "runs": results,
+    }
+
+
+def parse_override(value: str):
+    """Return the (key, value) tuple of a KEY=VALUE configuration override."""
+    key, _, value = value.partition("=")
+
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        # Plain strings do not need quoting
+        pass
+
+    return key.strip().upper(), value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--fixture",
+        action="append",
+        choices=["small", "typical", "huge"],
+        help="fixture shops to measure, all of them by default",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument(
+        "--runs", type=int, default=2, help="runs per fixture, the first one is cold")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="override a configuration value, e.g. --set RENDER_WORKERS=4",
+    )
+    parser.add_argument("--output", help="results file, defaults to results/<time>.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    overrides = dict(parse_override(value) for value in args.set)
+
+    if args.child is not None:
+        result = measure(args.child, args.latency, args.runs, overrides)
+        print(json.dumps(result))
+        return
+
+    results = {
+        "timestamp": strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "fixtures": [],
+    }
+
+    for fixture in args.fixture or ["small", "typical", "huge"]:
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--child", fixture,
+            "--latency", str(args.latency),
+            "--runs", str(args.runs),
+        ]
+        for value in args.set:
+            command += ["--set", value]
+
+        output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout
+        result = json.loads(output)
+        results["fixtures"].append(result)
+
+        for index, run in enumerate(result["runs"]):
+            stages = ", ".join(
+                f"{stage} {totals['wall']:.2f}s" for stage, totals in run["stages"].items()
+            )
+            print(
+                f"{fixture} run {index + 1}: {run['wall']:.2f}s wall, {run['cpu']:.2f}s CPU, "
+                f"{run['peak_rss_kb'] or 0:,} KB peak, {run['output_bytes']:,} bytes ({stages})"
+            )
+
+    path = args.output or os.path.join(
+        BENCHMARKS, "results", f"{results['timestamp'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+    print(f"Saved results to {path}")
+
+
+if __name__ == "__main__":
+    main()
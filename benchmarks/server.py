@@ -0,0 +1,192 @@
+"""
+Local stand-in for the fortnite-api.com shop endpoint and its image CDN.
+"""
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from time import sleep
+
+from PIL import Image, ImageDraw
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+FIXTURES = os.path.join(BENCHMARKS, "fixtures")
+
+# Dimensions of the images served by fortnite-api.com
+ICON_SIZES = {"smallicon.png": 128, "icon.png": 512, "featured.png": 1024}
+
+
+def load_fixture(name: str, cdn: str) -> dict:
+    """Return the specified fixture with its icon urls pointing to `cdn`."""
+    with open(os.path.join(FIXTURES, f"{name}.json"), "r") as file:
+        return json.loads(file.read().replace("{cdn}", cdn))
+
+
+def render_icon(path: str) -> bytes:
+    """Return a deterministic PNG icon for the provided path."""
+    rng = random.Random(path)
+    size = ICON_SIZES.get(path.rsplit("/", 1)[-1], 512)
+
+    # Noise keeps the file size and decoding cost close to real icons
+    noise = Image.effect_noise((size // 4, size // 4), 64).resize((size, size))
+    color = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    icon = Image.blend(color, Image.merge("RGB", (noise, noise, noise)), 0.35)
+
+    mask = Image.new("L", (size, size))
+    ImageDraw.Draw(mask).ellipse(
+        (size // 8, size // 16, size - (size // 8), size - 1), fill=255)
+    icon.putalpha(mask)
+
+    buffer = BytesIO()
+    icon.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Serve the shop endpoint from a fixture and generated icons for every
+    other path, each response delayed by `latency` seconds. Icons are
+    answered with `icon_status` instead when it is not 200.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixture: str, latency: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.latency = latency
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.shop = load_fixture(fixture, self.url)
+        self.icons = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.icon_status = 200
+
+    def icon(self, path: str) -> bytes:
+        with self.lock:
+            if path not in self.icons:
+                self.icons[path] = render_icon(path)
+            return self.icons[path]
+
+    def icon_paths(self) -> list:
+        """Return the path of every icon referenced by the shop."""
+        data = json.dumps(self.shop)
+        paths = set()
+
+        for part in data.split(f'"{self.url}')[1:]:
+            paths.add(part.split('"', 1)[0])
+
+        return sorted(paths)
+
+    def warm_up(self) -> None:
+        """Generate every icon ahead of time, so it is not measured."""
+        for path in self.icon_paths():
+            self.icon(path)
+
+    @property
+    def shop_url(self) -> str:
+        return f"{self.url}/v2/shop/br/combined"
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+@contextmanager
+def serving(fixture: str, latency: float = 0.0):
+    """Serve the provided fixture within the block, its icons generated ahead of time."""
+    server = StandInServer(fixture, latency)
+    server.warm_up()
+    server.start()
+
+    try:
+        yield server
+    finally:
+        server.shutdown()
+
+
+def isolate(prefix: str, overrides: dict = None, record: bool = False) -> str:
+    """
+    Move to a new temporary directory linked to the assets and return it,
+    since Athena works relative to the current directory, keeping the
+    repository clean. The configuration `overrides` are then applied.
+
+    Unless `record` is True, like a real run, nothing is written besides
+    the caches: no snapshot, metrics nor image file.
+    """
+    directory = tempfile.mkdtemp(prefix=prefix)
+    os.symlink(os.path.join(ROOT, "assets"), os.path.join(directory, "assets"))
+    os.chdir(directory)
+
+    from configuration import Config
+
+    values = {}
+    if not record:
+        values = {"SNAPSHOT_DIRECTORY": "", "METRICS_DIRECTORY": "", "SAVE_OUTPUT": False}
+    values.update(overrides or {})
+
+    # Before anything reads the configuration at import time
+    for key, value in values.items():
+        setattr(Config, key, value)
+
+    return directory
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        sleep(self.server.latency)
+
+        path = self.path.split("?", 1)[0]
+
+        if path == "/v2/shop/br/combined":
+            self.respond(json.dumps(self.server.shop).encode(), "application/json")
+            return
+
+        if self.server.icon_status != 200:
+            self.send_response(self.server.icon_status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        content = self.server.icon(path)
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+
+        # HTTP 304 (Not Modified)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.respond(content, "image/png", {"ETag": etag})
+
+    def respond(self, content: bytes, content_type: str, headers: dict = None) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixture", default="typical")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = StandInServer(args.fixture, args.latency, args.port)
+    print(f"Serving {args.fixture} shop on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,87 @@
+"""
+Measure the cold start of every command line stage.
+
+Each stage imports what `cli.py` imports for it in a fresh interpreter, the
+time to interpreter exit is reported along with the heavy dependencies which
+got loaded. `all` is everything the former single entry point imported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+STAGES = {
+    "cli": ["cli"],
+    "fetch": ["cli", "fetcher", "cache"],
+    "render": ["cli", "itemshop"],
+    "tweet": ["cli", "publisher"],
+    "serve": ["cli", "service"],
+    "all": ["cli", "itemshop", "publisher", "twitter", "googletrans", "coloredlogs"],
+}
+
+HEAVY = ["PIL.Image", "numpy", "requests", "twitter", "googletrans", "coloredlogs"]
+
+SCRIPT = """
+import json, sys
+from time import perf_counter
+start = perf_counter()
+for module in {modules!r}:
+    try:
+        __import__(module)
+    except ImportError:
+        pass
+imports = perf_counter() - start
+print(json.dumps({{"imports": imports, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(modules: list, runs: int) -> dict:
+    """Return the cold start measurements of importing the provided modules."""
+    totals, imports = [], []
+
+    for _ in range(runs):
+        script = SCRIPT.format(modules=modules, heavy=HEAVY)
+        start = perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", script], cwd=ROOT, stdout=subprocess.PIPE, check=True
+        ).stdout
+        totals.append(perf_counter() - start)
+
+        result = json.loads(output)
+        imports.append(result["imports"])
+
+    return {
+        "total": statistics.median(totals),
+        "imports": statistics.median(imports),
+        "loaded": result["loaded"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="interpreters per stage")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for stage, modules in STAGES.items():
+        results[stage] = measure(modules, args.runs)
+        print(
+            f"{stage}: {results[stage]['total'] * 1000:.0f} ms total, "
+            f"{results[stage]['imports'] * 1000:.0f} ms imports "
+            f"({', '.join(results[stage]['loaded']) or 'no heavy dependency'})"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Tweet the fixture shops to a local stand-in for the Twitter API.
+
+The same Athena instance renders and tweets every run, like the daemon does,
+and the tweets are checked against the stand-in: the credentials must only
+be verified once, the uploaded media must be the rendered image byte for
+byte, uploaded in chunks when larger than `--chunk-size`. Exits with status
+1 when a check fails.
+"""
+import argparse
+import os
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCHMARKS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--fixture",
+        action="append",
+        choices=["small", "typical", "huge"],
+        help="fixture shops to tweet, small and typical by default",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="tweets per fixture")
+    parser.add_argument(
+        "--chunk-size", type=int, default=1024 * 1024, help="bytes per uploaded chunk")
+    args = parser.parse_args()
+
+    from server import isolate, serving
+
+    # Within the Twitter image limit
+    isolate("athena-tweet-", {"OUTPUT_FORMAT": "auto"})
+
+    from configuration import TwitterConfig
+
+    from twitter_server import TwitterStandIn
+
+    twitter = TwitterStandIn()
+    twitter.start()
+
+    TwitterConfig.ENABLED = True
+    TwitterConfig.CHUNK_SIZE = args.chunk_size
+    TwitterConfig.API_URL = twitter.url
+    TwitterConfig.UPLOAD_URL = twitter.url
+
+    from itemshop import Athena
+    from metrics import metrics
+
+    passed = True
+
+    def check(condition: bool, message: str) -> None:
+        nonlocal passed
+
+        if not condition:
+            print(f"FAILED: {message}")
+            passed = False
+
+    athena = Athena()
+
+    for fixture in args.fixture or ["small", "typical"]:
+        with serving(fixture) as server:
+            athena.shop_url = server.shop_url
+
+            for _ in range(args.runs):
+                statuses = len(twitter.statuses)
+                initialized = twitter.counts.get("upload_init", 0)
+                metrics.reset()
+
+                with athena.record_run():
+                    athena.publish_all(athena.fetch_shops())
+
+                stages = metrics.summary()["stages"]
+                size = len(athena.output_data)
+                chunks = -(-size // args.chunk_size)
+                print(
+                    f"{fixture}: {stages.get('tweet', {}).get('seconds', 0.0):.2f}s tweet, "
+                    f"{size / 1024:,.0f} KB in {chunks} chunk{'s' if chunks > 1 else ''}"
+                )
+
+                check(len(twitter.statuses) == statuses + 1, "no status posted")
+                if len(twitter.statuses) == statuses + 1:
+                    media_ids = twitter.statuses[-1]["media_ids"]
+                    check(
+                        len(media_ids) == 1 and twitter.media[media_ids[0]] == athena.output_data,
+                        "uploaded media differs from the rendered image",
+                    )
+
+                check(
+                    (twitter.counts.get("upload_init", 0) > initialized) == (chunks > 1),
+                    "chunked upload used for an image of a single chunk, or the opposite",
+                )
+                check(not os.path.exists(athena.output_path), "image written to disk")
+
+    counts = twitter.counts
+    print(", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())))
+
+    check(counts.get("verify_credentials") == 1, "credentials verified more than once")
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Local stand-in for the parts of the Twitter API used to tweet the Item Shop:
+the credentials check, the simple and chunked media uploads and the status
+update. Point `TwitterConfig.API_URL` and `TwitterConfig.UPLOAD_URL` at it.
+"""
+import json
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class TwitterStandIn(ThreadingHTTPServer):
+    """
+    Accept every request, keeping the uploaded media and the posted statuses
+    so that they can be checked, along with the number of requests of each
+    kind.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), TwitterHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/1.1"
+        self.lock = threading.Lock()
+        self.media = {}
+        self.statuses = []
+        self.counts = {}
+
+    def count(self, kind: str) -> None:
+        with self.lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def create_media(self, content: bytes = b"") -> int:
+        """Return the id of a new media holding the provided content."""
+        with self.lock:
+            media_id = 1000 + len(self.media)
+            self.media[media_id] = bytearray(content)
+            return media_id
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class TwitterHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+
+        if path == "/1.1/account/verify_credentials.json":
+            self.server.count("verify_credentials")
+            self.respond({"id": 1, "screen_name": "athena"})
+            return
+
+        self.respond({"errors": [{"code": 34, "message": "Not found"}]}, 404)
+
+    def do_POST(self) -> None:
+        path = urlsplit(self.path).path
+        form = self.read_form()
+
+        if path == "/1.1/media/upload.json":
+            self.upload(form)
+        elif path == "/1.1/statuses/update.json":
+            self.server.count("update")
+            media_ids = form.get("media_ids", b"").decode()
+            status = {
+                "id": 2000 + len(self.server.statuses),
+                "text": form["status"].decode(),
+                "media_ids": [int(media_id) for media_id in media_ids.split(",") if media_id],
+            }
+            self.server.statuses.append(status)
+            self.respond(status)
+        else:
+            self.respond({"errors": [{"code": 34, "message": "Not found"}]}, 404)
+
+    def upload(self, form: dict) -> None:
+        command = form.get("command", b"").decode()
+
+        if command == "":
+            self.server.count("upload")
+            self.respond({"media_id": self.server.create_media(form["media"])})
+        elif command == "INIT":
+            self.server.count("upload_init")
+            self.respond({"media_id": self.server.create_media()})
+        elif command == "APPEND":
+            self.server.count("upload_append")
+            self.server.media[int(form["media_id"])] += form["media"]
+            # Twitter answers APPEND with an empty body
+            self.send_response(204)
+            self.end_headers()
+        elif command == "FINALIZE":
+            self.server.count("upload_finalize")
+            media_id = int(form["media_id"])
+            self.respond({"media_id": media_id, "size": len(self.server.media[media_id])})
+        else:
+            self.respond({"errors": [{"code": 38, "message": "Unknown command"}]}, 400)
+
+    def read_form(self) -> dict:
+        """Return the fields of the query string and of the body, as bytes."""
+        form = {key: value.encode() for key, value in parse_qsl(urlsplit(self.path).query)}
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "")
+
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+
+            for part in message.iter_parts():
+                name = part.get_param("name", header="Content-Disposition")
+                form[name] = part.get_payload(decode=True)
+        else:
+            form.update(
+                (key, value.encode()) for key, value in parse_qsl(body.decode()))
+
+        return form
+
+    def respond(self, data: dict, status: int = 200) -> None:
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    server = TwitterStandIn(args.port)
+    print(f"Serving the Twitter API on {server.url}")
+    server.serve_forever()
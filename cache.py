@@ -0,0 +1,510 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from time import time
+from typing import TYPE_CHECKING
+
+import requests
+
+if TYPE_CHECKING:
+    # Imported by the stores of images only, fetching the Item Shop does
+    # not load the imaging dependencies
+    from PIL import Image
+
+from metrics import metrics
+from network import http
+
+log = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    Directory of files described by an index, least recently used files are
+    evicted once the directory grows past `max_size` bytes.
+
+    Every entry of the index holds the name of its file as `hash`, its
+    `size` and the time it was last `accessed`. The whole cache is discarded
+    when `version` differs from the one it was written with.
+    """
+
+    name = "Cache"
+
+    def __init__(self, directory: str, max_size: int, version: str = None):
+        self.directory = directory
+        self.max_size = max_size
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = self.load_index()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def load_index(self) -> dict:
+        """Return the cache index, empty if missing, unreadable or outdated."""
+        try:
+            with open(self.index_path, "r") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except Exception as error:
+            log.warning(f"Failed to read {self.name.lower()} index, {error}")
+            data = {}
+
+        if data.get("version") == self.version and "entries" in data:
+            return data["entries"]
+
+        log.info(f"{self.name} is outdated, clearing it")
+        for filename in os.listdir(self.directory):
+            try:
+                os.remove(self.blob_path(filename))
+            except OSError:
+                pass
+        return {}
+
+    def write_blob(self, digest: str, content: bytes) -> None:
+        """Write the provided file to the cache, unless already there."""
+        path = self.blob_path(digest)
+
+        if not os.path.exists(path):
+            temp = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp, "wb") as file:
+                file.write(content)
+            os.replace(temp, path)
+
+    def remove_blob(self, digest: str) -> bool:
+        """
+        Remove the specified file unless another entry still uses it, with
+        the lock held. Return True if removed.
+        """
+        # Blobs may be shared by several entries with the same content
+        if any(entry["hash"] == digest for entry in self.index.values()):
+            return False
+
+        try:
+            os.remove(self.blob_path(digest))
+        except OSError:
+            pass
+        return True
+
+    def discard(self, key: str) -> None:
+        """Remove the specified entry along with its file."""
+        with self.lock:
+            entry = self.index.pop(key, None)
+
+            if entry is not None:
+                self.remove_blob(entry["hash"])
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until under the size limit."""
+        with self.lock:
+            blobs = {}
+            for entry in self.index.values():
+                blobs[entry["hash"]] = entry["size"]
+            size = sum(blobs.values())
+
+            by_access = sorted(self.index.items(), key=lambda i: i[1]["accessed"])
+            for key, entry in by_access:
+                if size <= self.max_size:
+                    break
+
+                del self.index[key]
+
+                if self.remove_blob(entry["hash"]):
+                    size -= entry["size"]
+
+    def save(self) -> None:
+        """Evict stale entries, then write the cache index to disk."""
+        self.evict()
+
+        with self.lock:
+            temp = f"{self.index_path}.tmp"
+            with open(temp, "w") as file:
+                json.dump({"version": self.version, "entries": self.index}, file)
+            os.replace(temp, self.index_path)
+
+        log.info(f"{self.name}: {self.hits} hits, {self.misses} misses")
+        counter = self.name.lower().replace(" ", "_")
+        metrics.increment(f"{counter}_hits", self.hits)
+        metrics.increment(f"{counter}_misses", self.misses)
+        self.hits = 0
+        self.misses = 0
+
+
+class IconCache(DiskCache):
+    """
+    On-disk HTTP cache for the item icons.
+
+    Responses are stored by content hash and indexed by url along with their
+    ETag/Last-Modified validators, so that a cached icon only costs a
+    conditional GET.
+    """
+
+    name = "Icon cache"
+    # Serve the cached copies without revalidating them, never download
+    offline = False
+
+    def fetch(self, url: str):
+        """
+        Return the body of the specified url, revalidating the cached copy
+        when there is one. Return None if the request failed.
+        """
+        with self.lock:
+            entry = self.index.get(url)
+
+        if self.offline is True:
+            return self.read_offline(url, entry)
+
+        headers = {}
+        if entry is not None and os.path.exists(self.blob_path(entry["hash"])):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        res = http.get(url, headers=headers)
+
+        if res is None:
+            log.critical(f"Failed to GET {url}")
+            return
+
+        # HTTP 304 (Not Modified)
+        if res.status_code == 304 and headers:
+            try:
+                with open(self.blob_path(entry["hash"]), "rb") as file:
+                    content = file.read()
+            except OSError:
+                # Removed behind our back, download it again
+                with self.lock:
+                    self.index.pop(url, None)
+                metrics.increment("http_retries")
+                return self.fetch(url)
+
+            with self.lock:
+                entry["accessed"] = time()
+                self.hits += 1
+            return content
+
+        # HTTP 200 (OK)
+        if res.status_code == 200:
+            self.store(url, res)
+            with self.lock:
+                self.misses += 1
+            return res.content
+
+        log.critical(f"Failed to GET {url} (HTTP {res.status_code})")
+
+    def read_offline(self, url: str, entry: dict):
+        """Return the cached copy of the specified url, None if missing."""
+        try:
+            with open(self.blob_path(entry["hash"]), "rb") as file:
+                content = file.read()
+        except (TypeError, OSError):
+            log.error(f"{url} is not cached, unavailable offline")
+            with self.lock:
+                self.misses += 1
+            return
+
+        with self.lock:
+            entry["accessed"] = time()
+            self.hits += 1
+        return content
+
+    def store(self, url: str, res: requests.Response) -> None:
+        """Write the provided response to the cache, in place of the previous copy."""
+        digest = hashlib.sha256(res.content).hexdigest()
+        self.write_blob(digest, res.content)
+
+        with self.lock:
+            previous = self.index.get(url)
+            self.index[url] = {
+                "hash": digest,
+                "etag": res.headers.get("ETag"),
+                "last_modified": res.headers.get("Last-Modified"),
+                "size": len(res.content),
+                "accessed": time(),
+            }
+
+            # Not counted by the index anymore, it would never be evicted
+            if previous is not None and previous["hash"] != digest:
+                self.remove_blob(previous["hash"])
+
+
+class CardStore(DiskCache):
+    """
+    On-disk store of the rendered cards, keyed by a digest of everything
+    which goes into rendering them.
+    """
+
+    name = "Card store"
+
+    def __contains__(self, digest: str) -> bool:
+        with self.lock:
+            return digest in self.index
+
+    def get(self, digest: str):
+        """Return the stored card of the provided digest, None if missing."""
+        with self.lock:
+            entry = self.index.get(digest)
+
+        if entry is None:
+            return
+
+        from PIL import Image
+
+        try:
+            card = Image.open(self.blob_path(entry["hash"]))
+            card.load()
+        except Exception as error:
+            log.warning(f"Failed to read stored card {digest}, {error}")
+            self.discard(digest)
+            return
+
+        with self.lock:
+            entry["accessed"] = time()
+            self.hits += 1
+        return card
+
+    def put(self, digest: str, card: "Image.Image") -> None:
+        """Store the provided card under the provided digest."""
+        buffer = BytesIO()
+        # Favor encoding speed, cards are small and stored lossless
+        card.save(buffer, "PNG", compress_level=1)
+        content = buffer.getvalue()
+
+        self.write_blob(digest, content)
+
+        with self.lock:
+            self.index[digest] = {
+                "hash": digest,
+                "size": len(content),
+                "accessed": time(),
+            }
+            self.misses += 1
+
+
+class VariantStore(DiskCache):
+    """
+    On-disk store of the resized item icons, keyed by a digest of the
+    source icon, of the box it is resized to and of the resampling.
+
+    Card rendering processes read and write it too, so the files are the
+    source of truth: their modification time is their last access, and the
+    index is rebuilt from them when saved.
+    """
+
+    name = "Variant store"
+
+    @staticmethod
+    def digest(content: bytes, width: int, height: int, resample: str) -> str:
+        """Return the key of the provided source icon resized to the specified box."""
+        digest = hashlib.sha256(content)
+        digest.update(f"|{width}x{height}|{resample}".encode())
+        return digest.hexdigest()
+
+    def get(self, digest: str):
+        """Return the stored icon of the provided digest, None if missing."""
+        path = self.blob_path(digest)
+
+        from PIL import Image
+
+        try:
+            icon = Image.open(path)
+            icon.load()
+            os.utime(path)
+        except Exception as error:
+            if not isinstance(error, FileNotFoundError):
+                log.warning(f"Failed to read stored icon {digest}, {error}")
+            with self.lock:
+                self.misses += 1
+            return
+
+        with self.lock:
+            self.hits += 1
+        return icon
+
+    def put(self, digest: str, icon: "Image.Image") -> None:
+        """Store the provided resized icon under the provided digest."""
+        buffer = BytesIO()
+        icon.save(buffer, "PNG", compress_level=1)
+        self.write_blob(digest, buffer.getvalue())
+
+    def save(self) -> None:
+        """Rebuild the index from the stored files, then save it."""
+        index = {}
+
+        for entry in os.scandir(self.directory):
+            if entry.name == "index.json" or entry.name.endswith(".tmp"):
+                continue
+
+            stat = entry.stat()
+            index[entry.name] = {
+                "hash": entry.name,
+                "size": stat.st_size,
+                "accessed": stat.st_mtime,
+            }
+
+        with self.lock:
+            self.index = index
+
+        super().save()
+
+
+class MemoryCache:
+    """
+    In-memory cache of the least recently used values, at most `max_size`
+    bytes as measured by `sizeof`. Shared by concurrent renders, which each
+    see it through their own `view`.
+    """
+
+    def __init__(self, max_size: int, sizeof):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, key):
+        """Return a (found, value) tuple for the provided key."""
+        with self.lock:
+            if key not in self.entries:
+                return False, None
+
+            self.entries.move_to_end(key)
+            return True, self.entries[key][0]
+
+    def put(self, key, value) -> None:
+        size = self.sizeof(value)
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+            if size > self.max_size:
+                return
+
+            self.entries[key] = (value, size)
+            self.size += size
+
+            while self.size > self.max_size:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def discard(self, key) -> None:
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+    def view(self):
+        return MemoryView(self)
+
+
+class MemoryView(dict):
+    """
+    Values of a MemoryCache seen by a single render. Values are kept once
+    looked up, so that they can not be evicted between being found and
+    being read, and written through to the cache. None, such as an icon
+    which failed to download, is only seen by the render and removes the
+    value from the cache, so that the following renders try again.
+    """
+
+    def __init__(self, cache: MemoryCache):
+        super().__init__()
+        self.cache = cache
+
+    def __contains__(self, key) -> bool:
+        if super().__contains__(key):
+            return True
+
+        found, value = self.cache.lookup(key)
+
+        if found:
+            super().__setitem__(key, value)
+
+        return found
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+
+        if value is not None:
+            self.cache.put(key, value)
+        else:
+            self.cache.discard(key)
+
+
+class SnapshotStore:
+    """
+    Gzipped copies of the fetched Item Shops, kept so that past Item Shops
+    can be rendered again without the API.
+
+    Every distinct payload is stored once, named after the date of the Item
+    Shop and a digest of the payload.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def put(self, shops: dict) -> str:
+        """Store the provided Item Shops, by language, and return their key."""
+        content = json.dumps(shops, sort_keys=True, separators=(",", ":")).encode()
+        date = next(iter(shops.values()))["date"].split("T")[0]
+        key = f"{date}-{hashlib.sha256(content).hexdigest()[:16]}"
+        path = self.path(key)
+
+        if not os.path.exists(path):
+            # Without a timestamp, the same payload always compresses the same
+            with open(f"{path}.tmp", "wb") as file:
+                file.write(gzip.compress(content, 9, mtime=0))
+            os.replace(f"{path}.tmp", path)
+
+            log.info(f"Saved Item Shop snapshot {key}, {os.path.getsize(path) / 1024:,.0f} KB")
+
+        return key
+
+    def keys(self) -> list:
+        """Return the key of every snapshot, oldest first."""
+        keys = [
+            filename[:-len(".json.gz")]
+            for filename in os.listdir(self.directory)
+            if filename.endswith(".json.gz")
+        ]
+
+        # Several snapshots of the same day are ordered by time of storage
+        return sorted(keys, key=lambda k: (k.rsplit("-", 1)[0], os.path.getmtime(self.path(k))))
+
+    def get(self, key: str = None):
+        """
+        Return the Item Shops of the specified snapshot, the latest one of a
+        date (YYYY-MM-DD) or the latest one overall. Return None if missing.
+        """
+        keys = [k for k in self.keys() if key is None or k == key or k.startswith(f"{key}-")]
+
+        if len(keys) == 0:
+            log.critical(f"Item Shop snapshot {key or ''} not found")
+            return
+
+        try:
+            with open(self.path(keys[-1]), "rb") as file:
+                return json.loads(gzip.decompress(file.read()))
+        except Exception as error:
+            log.critical(f"Failed to read Item Shop snapshot {keys[-1]}, {error}")
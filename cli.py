@@ -0,0 +1,224 @@
+"""
+Athena command line
+
+Every stage can be run on its own: `fetch` saves the Item Shop to disk,
+`render` generates the images of the saved Item Shop and `tweet` tweets the
+rendered images. Each stage only imports the dependencies it needs.
+
+`replay` generates the images of a past Item Shop snapshot offline,
+`serve` renders the images of other Athena processes over HTTP, and `pack`
+builds the asset packs which the layers are opened from.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+log = logging.getLogger(__name__)
+
+# Handed from one stage to the next
+SHOP_PATH = "shop.json"
+RENDERED_PATH = "rendered.json"
+
+
+def read_json(path: str):
+    """Return the content of the provided JSON file, None if missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        log.critical(f"{path} not found, run the previous stage first")
+    except Exception as error:
+        log.critical(f"Failed to read {path}, {error}")
+
+
+def write_json(path: str, data) -> None:
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def fetch(args) -> bool:
+    """Save the current Item Shop of every target language."""
+    from cache import SnapshotStore
+    from fetcher import SHOP_URL, fetch_shops, target_languages
+    from metrics import metrics
+    from network import http
+    from configuration import Config
+
+    snapshots = None
+    if Config.SNAPSHOT_DIRECTORY:
+        snapshots = SnapshotStore(Config.SNAPSHOT_DIRECTORY)
+
+    http.start_run()
+
+    with metrics.record(Config.METRICS_DIRECTORY, args.profile):
+        shops = fetch_shops(SHOP_URL, target_languages(), snapshots)
+
+    if shops is None:
+        return False
+
+    write_json(SHOP_PATH, shops)
+    log.info(f"Saved Item Shop to {SHOP_PATH}")
+    return True
+
+
+def render(args) -> bool:
+    """Generate the images of the saved Item Shop, without tweeting them."""
+    shops = read_json(SHOP_PATH)
+
+    if shops is None:
+        return False
+
+    from itemshop import Athena
+
+    athena = Athena()
+    athena.profile = args.profile
+    athena.twitter_enabled = False
+    # Read back by the tweet stage
+    athena.save_output = True
+
+    with athena.record_run():
+        saved = athena.publish_all(shops)
+
+    write_json(RENDERED_PATH, athena.rendered)
+    return saved
+
+
+def tweet(args) -> bool:
+    """Tweet the rendered images, without rendering them again."""
+    rendered = read_json(RENDERED_PATH)
+
+    if rendered is None:
+        return False
+
+    from publisher import Publisher
+
+    publisher = Publisher()
+    tweeted = True
+
+    for image in rendered:
+        tweeted = publisher.tweet_file(image["path"], image["date"]) and tweeted
+
+    return tweeted
+
+
+def replay(args) -> bool:
+    """Generate the images of a stored Item Shop snapshot, without network access."""
+    from itemshop import Athena
+
+    athena = Athena()
+    athena.profile = args.profile
+
+    if args.list:
+        if athena.snapshots is not None:
+            for key in athena.snapshots.keys():
+                print(key)
+        return True
+
+    return athena.replay(args.snapshot)
+
+
+def serve(args) -> bool:
+    """Serve the rendering of Item Shop images and cards over HTTP."""
+    from service import serve as serve_renders
+
+    serve_renders(args.host, args.port)
+    return True
+
+
+def pack(args) -> bool:
+    """Build the asset pack of every style, opened instead of the loose layers."""
+    from pack import AssetPack
+    from util import BLEND_COLORS
+    from configuration import Config
+
+    directory = Config.PACK_DIRECTORY or "packs"
+    styles = args.style or sorted(
+        entry.name for entry in os.scandir("assets/images") if entry.is_dir())
+
+    for style in styles:
+        if not os.path.isdir(f"assets/images/{style}"):
+            log.critical(f"Icon Style {style} not found.")
+            return False
+
+        AssetPack.build(style, os.path.join(directory, f"{style}.pack"), BLEND_COLORS)
+
+    return True
+
+
+def run(args) -> bool:
+    """Fetch, render and tweet the Item Shop in a single process."""
+    from itemshop import Athena
+
+    athena = Athena()
+    athena.profile = args.profile
+
+    if args.daemon:
+        athena.daemon()
+    else:
+        athena.start()
+
+    return True
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for name, function in [
+        ("fetch", fetch),
+        ("render", render),
+        ("tweet", tweet),
+        ("replay", replay),
+        ("serve", serve),
+        ("pack", pack),
+        ("run", run),
+    ]:
+        subparser = subparsers.add_parser(name, help=function.__doc__)
+        subparser.set_defaults(function=function)
+
+        if name not in ["tweet", "serve", "pack"]:
+            subparser.add_argument(
+                "--profile",
+                action="store_true",
+                help="write a cProfile dump of every run to profiles/",
+            )
+
+    subparsers.choices["replay"].add_argument(
+        "snapshot",
+        nargs="?",
+        help="snapshot key or date (YYYY-MM-DD), the latest snapshot by default",
+    )
+    subparsers.choices["replay"].add_argument(
+        "--list", action="store_true", help="list the stored snapshots")
+    subparsers.choices["serve"].add_argument(
+        "--host", help="address to listen on, SERVICE_HOST by default")
+    subparsers.choices["serve"].add_argument(
+        "--port", type=int, help="port to listen on, SERVICE_PORT by default")
+    subparsers.choices["pack"].add_argument(
+        "style", nargs="*", help="styles to pack, every one by default")
+    subparsers.choices["run"].add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep running and regenerate the itemshop whenever it changes",
+    )
+
+    args = parser.parse_args(argv)
+
+    import coloredlogs
+
+    coloredlogs.install(
+        level="INFO", fmt="[%(asctime)s] %(message)s", datefmt="%I:%M:%S")
+
+    try:
+        if args.function(args) is not True:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        log.info("Exiting...")
+        sys.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+from PIL import Image
+
+from metrics import metrics
+
+# Optional, imported by the first Compositor so that the cards composited
+# with PIL do not pay for it
+numpy = None
+
+# Cards composited together, bounds the memory of the stacked arrays
+BATCH_SIZE = 12
+
+
+def blend(destination, source, mask):
+    """
+    Return `source` pasted over `destination` through `mask` (uint8 arrays,
+    the mask with a single channel), rounded exactly like `Image.paste`.
+    """
+    # At most 255 * 255 + 128, 16 bits are enough
+    mask = mask.astype(numpy.uint16)
+    value = destination * (255 - mask)
+    value += source * mask
+    value += 128
+    value += value >> 8
+    value >>= 8
+    return value.astype(numpy.uint8)
+
+
+def window(boxes: list, width: int, height: int):
+    """Return the (left, top, right, bottom) union of the provided boxes within the bounds."""
+    return (
+        max(0, min(box[0] for box in boxes)),
+        max(0, min(box[1] for box in boxes)),
+        min(width, max(box[2] for box in boxes)),
+        min(height, max(box[3] for box in boxes)),
+    )
+
+
+class Compositor:
+    """
+    Composite the cards and the Item Shop grid as stacked NumPy arrays,
+    a batch of cards at a time, rather than with one `Image.paste` per
+    layer and per card. The arithmetic of `Image.paste` and `ImageChops` is
+    reproduced, so that the output matches the PIL path.
+    """
+
+    def __init__(self):
+        global numpy
+
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("NumPy is required by the NumPy compositor")
+
+    @metrics.timed("composite")
+    def compose_cards(self, templates: list, layers: list) -> list:
+        """
+        Return the card images built from the provided (base, frame)
+        templates, onto which the matching list of (image, position, masked)
+        layers is pasted in order, then the layers of the frame.
+        """
+        cards = numpy.stack([numpy.asarray(base) for base, _ in templates])
+        layers = [
+            card_layers + [(layer, (0, 0), True) for layer in frame]
+            for (_, frame), card_layers in zip(templates, layers)
+        ]
+        count, height, width, _ = cards.shape
+
+        # The n-th layer of every card is pasted in a single pass, over the
+        # part of the cards it covers
+        for n in range(max((len(card_layers) for card_layers in layers), default=0)):
+            pasted = [
+                (index, card_layers[n])
+                for index, card_layers in enumerate(layers)
+                if len(card_layers) > n
+            ]
+            boxes = [
+                (x, y, x + image.width, y + image.height)
+                for _, (image, (x, y), _) in pasted
+            ]
+            left, top, right, bottom = window(boxes, width, height)
+
+            if left >= right or top >= bottom:
+                continue
+
+            source = numpy.zeros((len(pasted), bottom - top, right - left, 4), numpy.uint8)
+            mask = numpy.zeros((len(pasted), bottom - top, right - left, 1), numpy.uint8)
+
+            for slot, (_, (image, position, masked)) in enumerate(pasted):
+                self.place(source[slot], mask[slot], image, position, masked, (left, top))
+
+            indices = [index for index, _ in pasted]
+            area = cards[indices, top:bottom, left:right].astype(numpy.uint16)
+            cards[indices, top:bottom, left:right] = blend(area, source, mask)
+
+        return [Image.fromarray(cards[index]) for index in range(count)]
+
+    @staticmethod
+    def place(source, mask, image: Image.Image, position: tuple, masked: bool,
+              origin: tuple) -> None:
+        """
+        Copy the provided image at `position` into the source and mask
+        arrays of a window starting at `origin`, clipped to the window.
+        """
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+
+        array = numpy.asarray(image)
+        x, y = position[0] - origin[0], position[1] - origin[1]
+        height, width = source.shape[:2]
+
+        left, top = max(0, x), max(0, y)
+        right, bottom = min(width, x + image.width), min(height, y + image.height)
+
+        if left >= right or top >= bottom:
+            return
+
+        area = array[(top - y):(bottom - y), (left - x):(right - x)]
+        source[top:bottom, left:right] = area
+        # Without mask, the image replaces what is below it
+        mask[top:bottom, left:right] = area[:, :, 3:] if masked else 255
+
+    @metrics.timed("composite")
+    def paste_cards(self, image: Image.Image, placements: list) -> None:
+        """
+        Paste the provided (card, position) placements onto the image, the
+        cards being their own mask, a batch of cards at a time.
+        """
+        for start in range(0, len(placements), BATCH_SIZE):
+            batch = placements[start:(start + BATCH_SIZE)]
+            left, top, right, bottom = window(
+                [(x, y, x + card.width, y + card.height) for card, (x, y) in batch],
+                image.width,
+                image.height,
+            )
+
+            if left >= right or top >= bottom:
+                continue
+
+            area = numpy.array(image.crop((left, top, right, bottom)))
+            slices = self.slices(batch, (left, top), area.shape)
+
+            if image.mode != "RGBA" or slices is None:
+                for card, position in batch:
+                    image.paste(card, position, card)
+                continue
+
+            cards = numpy.stack([numpy.asarray(card) for card, _ in batch])
+            below = numpy.stack([area[rows, columns] for rows, columns in slices])
+            blended = blend(below.astype(numpy.uint16), cards, cards[:, :, :, 3:])
+
+            for index, (rows, columns) in enumerate(slices):
+                area[rows, columns] = blended[index]
+
+            image.paste(Image.fromarray(area), (left, top))
+
+    @staticmethod
+    def slices(batch: list, origin: tuple, shape: tuple):
+        """
+        Return the (rows, columns) slices of the area starting at `origin`
+        covered by every card of the batch. Return None if the cards can not
+        be stacked, as they differ in size or stick out of the area.
+        """
+        if len({card.size for card, _ in batch}) != 1:
+            return
+
+        slices = []
+        for card, (x, y) in batch:
+            x, y = x - origin[0], y - origin[1]
+
+            if x < 0 or y < 0 or x + card.width > shape[1] or y + card.height > shape[0]:
+                return
+
+            slices.append((slice(y, y + card.height), slice(x, x + card.width)))
+
+        return slices
@@ -5,11 +5,48 @@ Configuration file for Athena
 
 class Config:
     DELAY_START: int = 0
+    POLL_INTERVAL: int = 300  # Seconds between Item Shop polls in daemon mode
+    POLL_JITTER: int = 30  # Random seconds added to or removed from the interval
     FORTINTE_API_KEY: str = ""
     LANGUAGE: str = "en"
     DATE_LANGUAGE: str = "en"
     STYLE: str = "old"  # old / new
+    TARGETS: list = []  # (language, style) tuples rendered in a single run, overrides the above
     CREATOR_CODE: str = "YourSupportACreatorCode"
+    DOWNLOAD_WORKERS: int = 8  # Max concurrent icon downloads
+    HTTP_TIMEOUT: int = 10  # Seconds without response before a request is abandoned
+    HTTP_RETRIES: int = 3  # Retries of a request failing with a network error, HTTP 429 or 5xx
+    HTTP_RETRY_BUDGET: int = 30  # Retries allowed for the whole run
+    HTTP_RUN_DEADLINE: int = 600  # Seconds after which a run stops sending requests, 0 to disable
+    RENDER_WORKERS: int = 0  # Processes rendering cards, 0 renders in the main process
+    PIPELINE_DEPTH: int = 16  # Entries downloaded or rendered ahead of the grid, bounds memory usage
+    STREAM_BANDS: bool = False  # Encode the image one row of cards at a time
+    LAYOUT: str = "classic"  # classic / packed, packs every section in the smallest image
+    LAYOUT_COLUMNS: int = 6  # Columns of cards across the packed layout
+    LAYOUT_MAX_WIDTH: int = 1920  # Pixels, the packed layout is at most this wide
+    COMPOSITOR: str = "pil"  # pil / numpy, composites a batch of cards at a time
+    OUTPUT_FORMAT: str = "png"  # png / webp / jpeg / auto
+    PNG_COMPRESS_LEVEL: int = 6  # 0 (fastest) to 9 (smallest)
+    PNG_OPTIMIZE: bool = False
+    PNG_COLORS: int = 0  # Quantize to a palette of this many colors, 0 to disable
+    OUTPUT_QUALITY: int = 90  # WebP / JPEG quality
+    OUTPUT_MAX_BYTES: int = 5 * 1024 * 1024  # Budget of the auto format
+    SAVE_OUTPUT: bool = True  # Also write the image to disk, it is tweeted from memory
+    METRICS_DIRECTORY: str = "metrics"  # Leave blank to disable the run metrics
+    CACHE_DIRECTORY: str = "cache"  # Leave blank to disable the icon cache
+    CACHE_MAX_SIZE: int = 256 * 1024 * 1024  # Bytes
+    CARD_STORE_MAX_SIZE: int = 128 * 1024 * 1024  # Bytes
+    VARIANT_STORE_MAX_SIZE: int = 64 * 1024 * 1024  # Bytes
+    SNAPSHOT_DIRECTORY: str = "snapshots"  # Leave blank to not keep the fetched Item Shops
+    PACK_DIRECTORY: str = "packs"  # Asset packs built by `python cli.py pack`, leave blank to always open the loose files
+    RENDER_SERVICE: str = ""  # Url of a render service, e.g. http://127.0.0.1:8090, leave blank to render locally
+    RENDER_SERVICE_TIMEOUT: int = 120  # Seconds
+    SERVICE_HOST: str = "127.0.0.1"  # Address the render service listens on
+    SERVICE_PORT: int = 8090
+    SERVICE_WORKERS: int = 2  # Concurrent renders of the render service
+    SERVICE_QUEUE_TIMEOUT: int = 30  # Seconds a render waits for a free worker before HTTP 503
+    SERVICE_ICON_MEMORY: int = 256 * 1024 * 1024  # Bytes of downloaded icons kept in memory
+    SERVICE_RESIZED_MEMORY: int = 256 * 1024 * 1024  # Bytes of resized icons kept in memory
 
 
 class TwitterConfig:
@@ -18,3 +55,6 @@ class TwitterConfig:
     API_SECRET: str = "XXXXXXXXXX"
     ACCESS_TOKEN: str = "XXXXXXXXXX"
     ACCESS_SECRET: str = "XXXXXXXXXX"
+    CHUNK_SIZE: int = 1024 * 1024  # Bytes, larger images are uploaded in chunks of this size
+    API_URL: str = ""  # Leave blank for Twitter, e.g. http://127.0.0.1:8001/1.1 for a stand-in
+    UPLOAD_URL: str = ""  # Leave blank for the Twitter upload API
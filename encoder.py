@@ -0,0 +1,182 @@
+import logging
+import struct
+import zlib
+from io import BytesIO
+from time import perf_counter
+
+from PIL import Image, ImageChops
+
+from metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# Of the encoded images, by file extension
+CONTENT_TYPES = {"png": "image/png", "webp": "image/webp", "jpg": "image/jpeg"}
+
+
+class Encoder:
+    """
+    Encode the Item Shop image with the configured output settings.
+
+    `auto` picks the fastest encoding which fits within `max_bytes`, trying
+    the lossless ones first.
+    """
+
+    def __init__(self, output_format: str = "png", compress_level: int = 6,
+                 optimize: bool = False, colors: int = 0, quality: int = 90,
+                 max_bytes: int = 5 * 1024 * 1024):
+        self.format = output_format.lower()
+        self.compress_level = compress_level
+        self.optimize = optimize
+        self.colors = colors
+        self.quality = quality
+        self.max_bytes = max_bytes
+
+    @metrics.timed("encode")
+    def encode(self, image: Image.Image):
+        """Return the encoded image and its file extension as a tuple."""
+        start = perf_counter()
+
+        if self.format == "auto":
+            data, extension = self.encode_auto(image)
+        elif self.format == "png":
+            data = self.encode_png(
+                image, self.compress_level, self.optimize, self.colors)
+            extension = "png"
+        elif self.format == "webp":
+            data, extension = self.encode_webp(image, self.quality), "webp"
+        elif self.format in ["jpeg", "jpg"]:
+            data, extension = self.encode_jpeg(image, self.quality), "jpg"
+        else:
+            raise ValueError(f"Unknown output format {self.format}")
+
+        log.info(
+            f"Encoded Item Shop image as {extension.upper()} in "
+            f"{perf_counter() - start:.2f}s, {len(data) / 1024:,.0f} KB"
+        )
+
+        return data, extension
+
+    def accepts_png(self, size: int) -> bool:
+        """
+        Return True if a plain RGBA PNG image of `size` bytes, such as one
+        written by PNGWriter, already matches the output settings.
+        """
+        if self.format == "auto":
+            return size <= self.max_bytes
+
+        return self.format == "png" and self.colors == 0 and not self.optimize
+
+    def encode_auto(self, image: Image.Image):
+        """
+        Return the first encoding which fits within the byte budget, the
+        smallest one when none does.
+        """
+        candidates = [
+            # Roughly ordered from the fastest to the slowest to encode
+            ("png", lambda: self.encode_png(image, 1)),
+            ("png", lambda: self.encode_png(image, 6)),
+            ("png", lambda: self.encode_png(image, 6, colors=256)),
+            ("jpg", lambda: self.encode_jpeg(image, self.quality)),
+            ("webp", lambda: self.encode_webp(image, self.quality)),
+            ("jpg", lambda: self.encode_jpeg(image, 75)),
+            ("jpg", lambda: self.encode_jpeg(image, 60)),
+        ]
+
+        smallest = None
+
+        for extension, encode in candidates:
+            data = encode()
+
+            if len(data) <= self.max_bytes:
+                return data, extension
+
+            if smallest is None or len(data) < len(smallest[0]):
+                smallest = (data, extension)
+
+        log.warning(
+            f"Item Shop image does not fit in {self.max_bytes:,} bytes, "
+            f"using the smallest encoding ({len(smallest[0]):,} bytes)"
+        )
+        return smallest
+
+    @staticmethod
+    def encode_png(image: Image.Image, compress_level: int = 6,
+                   optimize: bool = False, colors: int = 0) -> bytes:
+        buffer = BytesIO()
+
+        if colors > 0:
+            image = image.quantize(colors, method=Image.FASTOCTREE)
+
+        image.save(buffer, "PNG", compress_level=compress_level, optimize=optimize)
+        return buffer.getvalue()
+
+    @staticmethod
+    def encode_webp(image: Image.Image, quality: int) -> bytes:
+        buffer = BytesIO()
+        image.save(buffer, "WEBP", quality=quality, method=4)
+        return buffer.getvalue()
+
+    @staticmethod
+    def encode_jpeg(image: Image.Image, quality: int) -> bytes:
+        buffer = BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=quality)
+        return buffer.getvalue()
+
+
+class PNGWriter:
+    """
+    Write a RGBA PNG image one horizontal band at a time, so that only the
+    band being written has to be held in memory.
+    """
+
+    def __init__(self, file, width: int, height: int, compress_level: int = 6):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.compressor = zlib.compressobj(compress_level)
+
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bits per channel, color type 6 (RGBA), no interlacing
+        self.chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def chunk(self, kind: bytes, data: bytes) -> None:
+        """Write a PNG chunk of the specified kind."""
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    @metrics.timed("encode")
+    def write(self, band: Image.Image) -> None:
+        """Append the rows of the provided image, as wide as the PNG image."""
+        if band.width != self.width or self.rows + band.height > self.height:
+            raise ValueError("Band does not fit the PNG image")
+
+        band = band.convert("RGBA")
+
+        # Sub filter, each byte minus the same channel of the pixel on its
+        # left, which compresses much better than raw rows
+        left = Image.new("RGBA", band.size)
+        left.paste(band, (1, 0))
+        data = ImageChops.subtract_modulo(band, left).tobytes()
+
+        stride = self.width * 4
+        rows = b"".join(
+            b"\x01" + data[y * stride:(y + 1) * stride] for y in range(band.height)
+        )
+
+        compressed = self.compressor.compress(rows)
+        if compressed:
+            self.chunk(b"IDAT", compressed)
+
+        self.rows += band.height
+
+    def close(self) -> None:
+        """Finish the PNG image, every row must have been written."""
+        if self.rows != self.height:
+            raise ValueError(f"Wrote {self.rows} of {self.height} rows")
+
+        self.chunk(b"IDAT", self.compressor.flush())
+        self.chunk(b"IEND", b"")
@@ -0,0 +1,53 @@
+"""
+Fetch the Item Shop.
+
+Kept apart from the image generation, so that the `fetch` stage only loads
+the network dependencies.
+"""
+import logging
+
+from network import http
+from configuration import Config
+
+log = logging.getLogger(__name__)
+
+SHOP_URL = "https://fortnite-api.com/v2/shop/br/combined"
+
+
+def target_languages() -> list:
+    """Return the language of every configured target."""
+    if Config.TARGETS:
+        return [language for language, _ in Config.TARGETS]
+
+    return [Config.LANGUAGE]
+
+
+def fetch_shop(url: str, language: str):
+    """Return the current Item Shop in the provided language, None if the request failed."""
+    item_shop = http.get_json(url, {"language": language})
+
+    if item_shop is not None:
+        return item_shop["data"]
+
+
+def fetch_shops(url: str, languages: list, snapshots=None):
+    """
+    Return the current Item Shop of every provided language, None if any of
+    the requests failed. The Item Shops are kept in `snapshots` when provided.
+    """
+    shops = {}
+
+    for language in languages:
+        if language not in shops:
+            shops[language] = fetch_shop(url, language)
+
+            if shops[language] is None:
+                return
+
+    if snapshots is not None:
+        try:
+            snapshots.put(shops)
+        except Exception as error:
+            log.warning(f"Failed to save Item Shop snapshot, {error}")
+
+    return shops
@@ -1,23 +1,36 @@
 """
 Generate itemshop image
 """
+import hashlib
+import json
 import logging
 import os
 import sys
-from math import ceil
-from time import sleep
+import threading
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from itertools import islice
+from random import uniform
+from time import perf_counter, sleep
 
-import coloredlogs
-import twitter
 from PIL import Image, ImageDraw
-from googletrans import Translator
 
-from util import ImageUtil, Utility
+from cache import CardStore, IconCache, SnapshotStore, VariantStore
+from compositor import BATCH_SIZE, Compositor
+from encoder import CONTENT_TYPES, Encoder, PNGWriter
+from fetcher import SHOP_URL, fetch_shop, fetch_shops
+from layout import MARGIN, SECTIONS, TITLE_HEIGHT, Layout, classic_layout, packed_layout
+from metrics import metrics
+from model import ShopEntry
+from network import http
+from publisher import Publisher
+from translation import Translation
+from util import CARD_SIZE, CARD_VERSION, DOWNSCALE, ImageUtil
 from configuration import Config, TwitterConfig
 
 log = logging.getLogger(__name__)
-coloredlogs.install(
-    level="INFO", fmt="[%(asctime)s] %(message)s", datefmt="%I:%M:%S")
 
 
 class Athena:
@@ -35,15 +48,92 @@ class Athena:
         self.date_language = Config.DATE_LANGUAGE
         self.style = Config.STYLE
         self.creator_code = Config.CREATOR_CODE
+        self.download_workers = Config.DOWNLOAD_WORKERS
+        self.poll_interval = Config.POLL_INTERVAL
+        self.poll_jitter = Config.POLL_JITTER
+        self.shop_url = SHOP_URL
+        self.render_workers = Config.RENDER_WORKERS
+        self.pipeline_depth = Config.PIPELINE_DEPTH
+        self.stream_bands = Config.STREAM_BANDS
+        self.layout = Config.LAYOUT
+        self.render_service = Config.RENDER_SERVICE.rstrip("/")
+        self.layout_columns = Config.LAYOUT_COLUMNS
+        self.layout_max_width = Config.LAYOUT_MAX_WIDTH
+        self.encoder = Encoder(
+            Config.OUTPUT_FORMAT,
+            Config.PNG_COMPRESS_LEVEL,
+            Config.PNG_OPTIMIZE,
+            Config.PNG_COLORS,
+            Config.OUTPUT_QUALITY,
+            Config.OUTPUT_MAX_BYTES,
+        )
+        self.output_name = "itemshop"
+        self.output_path = "itemshop.png"
+        self.output_data = None
+        self.save_output = Config.SAVE_OUTPUT
+        self.metrics_directory = Config.METRICS_DIRECTORY
+        self.profile = False
+        self.render_pool = None
+        # Held while the caches are written, by every copy of the instance
+        self.cache_lock = threading.Lock()
+        self.compositor = None
+        self.icon_cache = None
+        self.card_store = None
+        self.variant_store = None
+        self.translation = None
+        self.snapshots = None
+        self.icons = {}
+        self.resized = None
+        self.rendered = []
+        self.publisher = Publisher()
         self.twitter_enabled = TwitterConfig.ENABLED
-        self.twitter_api_key = TwitterConfig.API_KEY
-        self.twitter_api_secret = TwitterConfig.API_SECRET
-        self.twitter_access_token = TwitterConfig.ACCESS_TOKEN
-        self.twitter_access_secret = TwitterConfig.ACCESS_SECRET
 
-        if not os.path.exists(f'assets/images/{self.style}'):
-            log.critical("Icon Style not found.")
-            sys.exit()
+        if Config.TARGETS:
+            # The date is translated in the language of each target
+            self.targets = [(language, style, language) for language, style in Config.TARGETS]
+        else:
+            self.targets = [(self.language, self.style, self.date_language)]
+
+        if len(self.targets) > 1:
+            # Icons resized once are shared by the cards of every target
+            self.resized = {}
+
+        for _, style, _ in self.targets:
+            if not os.path.exists(f'assets/images/{style}'):
+                log.critical(f"Icon Style {style} not found.")
+                sys.exit()
+
+            if Config.PACK_DIRECTORY:
+                ImageUtil().load_pack(style, Config.PACK_DIRECTORY)
+
+        if Config.CACHE_DIRECTORY:
+            self.icon_cache = IconCache(
+                os.path.join(Config.CACHE_DIRECTORY, "icons"), Config.CACHE_MAX_SIZE
+            )
+            self.card_store = CardStore(
+                os.path.join(Config.CACHE_DIRECTORY, "cards"),
+                Config.CARD_STORE_MAX_SIZE,
+                f"{ImageUtil().assets_version()}-{CARD_VERSION}",
+            )
+            self.variant_store = VariantStore(
+                os.path.join(Config.CACHE_DIRECTORY, "variants"),
+                Config.VARIANT_STORE_MAX_SIZE,
+            )
+            ImageUtil().load_widths(
+                os.path.join(Config.CACHE_DIRECTORY, "widths.json"))
+            self.translation = Translation(
+                os.path.join(Config.CACHE_DIRECTORY, "translations.json"))
+        else:
+            self.translation = Translation()
+
+        if Config.COMPOSITOR == "numpy":
+            try:
+                self.compositor = Compositor()
+            except ImportError:
+                log.warning("NumPy is not installed, defaulting to the PIL compositor")
+
+        if Config.SNAPSHOT_DIRECTORY:
+            self.snapshots = SnapshotStore(Config.SNAPSHOT_DIRECTORY)
 
         log.info("Loaded configuration")
 
@@ -53,318 +143,815 @@ class Athena:
             log.info(f"Delaying process start for {self.delay}s...")
             sleep(self.delay)
 
-        item_shop = Utility().get_url(
-            "https://fortnite-api.com/v2/shop/br/combined",
-            {"language": self.language},
-        )
+        with self.record_run():
+            shops = self.fetch_shops()
+
+            if shops is not None:
+                self.publish_all(shops)
+
+    def daemon(self) -> None:
+        """
+        Keep the process running, poll the Item Shop and generate and tweet
+        it only when it changed since the last poll.
+        """
+        if self.delay > 0:
+            log.info(f"Delaying process start for {self.delay}s...")
+            sleep(self.delay)
+
+        last_hash = None
+
+        while True:
+            try:
+                with self.record_run():
+                    shops = self.fetch_shops()
+
+                    if shops is not None:
+                        shop_hash = hashlib.sha256(
+                            json.dumps(shops, sort_keys=True).encode()
+                        ).hexdigest()
+
+                        if shop_hash == last_hash:
+                            log.info("Item Shop unchanged")
+                        elif self.publish_all(shops) is True:
+                            last_hash = shop_hash
+            except Exception as error:
+                log.error(f"Failed to process Item Shop, {error}")
+
+            interval = self.poll_interval + uniform(-self.poll_jitter, self.poll_jitter)
+            log.info(f"Next Item Shop poll in {interval:.0f}s")
+            sleep(max(0, interval))
+
+    @contextmanager
+    def record_run(self):
+        """
+        Record the metrics of the wrapped run and write them to the metrics
+        directory, along with a cProfile dump when profiling is enabled.
+        """
+        http.start_run()
+
+        with metrics.record(self.metrics_directory, self.profile):
+            yield
+
+    def fetch_shop(self, language: str = None):
+        """Return the current Item Shop, None if the request failed."""
+        return fetch_shop(self.shop_url, language or self.language)
+
+    def fetch_shops(self):
+        """
+        Return the current Item Shop of every target language, None if any
+        of the requests failed.
+        """
+        return fetch_shops(
+            self.shop_url, [language for language, _, _ in self.targets], self.snapshots)
+
+    def replay(self, key: str = None) -> bool:
+        """
+        Generate the images of the specified Item Shop snapshot, the latest
+        one by default, from the cached icons only. Nothing is downloaded
+        nor tweeted, and every card is rendered.
+
+        Return True if every image sucessfully saved.
+        """
+        if self.snapshots is None or self.icon_cache is None:
+            log.critical("Replaying requires SNAPSHOT_DIRECTORY and CACHE_DIRECTORY")
+            return False
+
+        shops = self.snapshots.get(key)
+
+        if shops is None:
+            return False
+
+        missing = {language for language, _, _ in self.targets} - set(shops)
+        if missing:
+            log.critical(f"Snapshot has no Item Shop in {', '.join(sorted(missing))}")
+            return False
+
+        self.icon_cache.offline = True
+        self.translation.offline = True
+        self.card_store = None
+        self.twitter_enabled = False
 
-        if item_shop is not None:
-            item_shop = item_shop["data"]
+        with self.record_run():
+            return self.publish_all(shops)
+
+    def publish_all(self, shops: dict) -> bool:
+        """
+        Generate and tweet the image of every target using the provided Item
+        Shops, by language. Icons are only downloaded for the first target.
+
+        Return True if every image sucessfully saved.
+        """
+        saved = True
+        self.rendered = []
 
-            # Strip time from the timestamp, we only need the date + translate
-            # in every language from googletrans
-            date = Translator().translate(
-                Utility().iso_to_human(item_shop["date"].split("T")[0]),
-                str='en',
-                dest=self.date_language
-            ).text
+        try:
+            for language, style, date_language in self.targets:
+                self.language = language
+                self.style = style
+                self.date_language = date_language
+
+                if len(self.targets) > 1:
+                    self.output_name = f"itemshop_{language}_{style}"
+
+                saved = self.publish(shops[language]) is True and saved
+        finally:
+            # Only shared by the targets of a single run
+            self.icons.clear()
+            if self.resized is not None:
+                self.resized.clear()
+
+        return saved
+
+    def publish(self, item_shop: dict) -> bool:
+        """
+        Generate the image of the provided Item Shop and tweet it if enabled.
+
+        Return True if image sucessfully saved.
+        """
+        # Strip time from the timestamp, we only need the date
+        with metrics.timer("translate"):
+            date = self.translation.date(
+                item_shop["date"].split("T")[0], self.date_language)
 
-            log.info(f"Retrieved Item Shop for {date}")
+        log.info(f"Retrieved Item Shop for {date}")
 
+        if self.render_service:
+            shop_image = self.request_image(item_shop)
+        else:
             shop_image = self.generate_image(date, item_shop)
 
-            if shop_image is True:
-                if self.twitter_enabled is True:
-                    self.tweet(date)
+        if shop_image is True:
+            self.rendered.append({"path": self.output_path, "date": date})
+
+            if self.twitter_enabled is True:
+                self.tweet(date)
+
+        return shop_image
+
+    @metrics.timed("request_image")
+    def request_image(self, item_shop: dict) -> bool:
+        """
+        Have the render service generate the Item Shop image using the
+        provided Item Shop.
+
+        Return True if image sucessfully saved.
+        """
+        res = http.post(
+            f"{self.render_service}/image",
+            {
+                "shop": item_shop,
+                "style": self.style,
+                "language": self.language,
+                "date_language": self.date_language,
+            },
+            timeout=Config.RENDER_SERVICE_TIMEOUT,
+        )
+
+        if res is None or res.status_code != 200:
+            error = "no response" if res is None else f"HTTP {res.status_code} {res.text}"
+            log.critical(f"Failed to render Item Shop image with the render service, {error}")
+            return False
+
+        extensions = {content_type: extension for extension, content_type in CONTENT_TYPES.items()}
+
+        try:
+            self.write_output(res.content, extensions[res.headers.get("Content-Type")])
+
+            log.info("Generated Item Shop image with the render service")
+            return True
+        except Exception as error:
+            log.critical(f"Failed to save Item Shop image, {error}")
+        return False
 
+    @metrics.timed("generate_image")
     def generate_image(self, date: str, item_shop: dict) -> bool:
         """
         Generate the Item Shop image using the provided Item Shop.
 
         Return True if image sucessfully saved.
         """
+        sections = [ShopEntry.parse_section(item_shop.get(key)) for key, _ in SECTIONS]
 
-        if item_shop["featured"] is not None:
-            featured = item_shop["featured"]["entries"]
-        else:
-            featured = []
+        if self.layout != "packed":
+            # Only Featured and Daily fit in the classic layout
+            sections = sections[:2] + [[] for _ in sections[2:]]
 
-        if item_shop["daily"] is not None:
-            daily = item_shop["daily"]["entries"]
-        else:
-            daily = []
+        layout = self.layout_image(date, sections)
+
+        if self.stream_bands is True:
+            return self.generate_image_bands(date, sections, layout)
+
+        shop_image = Image.new("RGBA", (layout.width, layout.height))
+
+        self.draw_background(shop_image, self.open_background())
+        self.draw_header(shop_image, date)
+        self.draw_titles(shop_image, layout)
+
+        cards = self.generate_cards([entry for entries in sections for entry in entries])
+
+        placements = []
 
-        # Determine the max amount of rows required for the current
-        # Item Shop when there are 3 columns for both Featured and Daily.
-        # This allows us to determine the image height.
+        for entries, section in zip(sections, layout.sections):
+            # Cards which failed to generate leave no gap
+            slots = iter(section.slots)
 
-        rows = max(ceil(len(featured) / 3), ceil(len(daily) / 3))
+            for _ in entries:
+                card = next(cards)
 
-        shop_image = Image.new("RGBA", (1920, ((545 * rows) + 340)))
+                if card is not None:
+                    placements.append((card, next(slots)))
+
+                if len(placements) == BATCH_SIZE:
+                    self.paste_cards(shop_image, placements)
+                    placements = []
+
+        self.paste_cards(shop_image, placements)
+
+        self.save_caches()
 
         try:
-            background = ImageUtil().open_image("background.png")
-            background = ImageUtil().resize_ratio(
-                background, shop_image.width, shop_image.height
-            )
-            shop_image.paste(
-                background, ImageUtil().align_center(
-                    shop_image.width, background.width)
-            )
+            self.write_output(*self.encoder.encode(shop_image))
+
+            log.info("Generated Item Shop image")
+            return True
+        except Exception as error:
+            log.critical(f"Failed to save Item Shop image, {error}")
+        return False
+
+    def generate_image_bands(self, date: str, sections: list, layout: Layout) -> bool:
+        """
+        Generate the Item Shop image one row of cards at a time, encoding
+        every band as soon as it is complete so that the whole image is
+        never held in memory.
+
+        Return True if image sucessfully saved.
+        """
+        background = self.open_background()
+
+        # Interleave the sections row by row, so that every band only waits
+        # on its own cards
+        order = sorted(
+            (section.slots[index][1], number, index)
+            for number, (entries, section) in enumerate(zip(sections, layout.sections))
+            for index in range(len(entries))
+        )
+        cards = zip(
+            (number for _, number, _ in order),
+            self.generate_cards([sections[number][index] for _, number, index in order]),
+        )
+        # Successfully generated cards of every section, by slot
+        received = [{} for _ in sections]
+        counts = [0 for _ in sections]
+
+        def take(top: int, bottom: int) -> list:
+            """Return the (card, position) placements of the cards within the band."""
+            placements = []
+
+            for number, section in enumerate(layout.sections):
+                for index, (x, y) in enumerate(section.slots):
+                    if y >= bottom or y + CARD_SIZE[1] <= top:
+                        continue
+
+                    while counts[number] <= index:
+                        try:
+                            card_number, card = next(cards)
+                        except StopIteration:
+                            break
+
+                        if card is not None:
+                            received[card_number][counts[card_number]] = card
+                            counts[card_number] += 1
+
+                    if index in received[number]:
+                        placements.append((received[number][index], (x, y - top)))
+
+                        if y + CARD_SIZE[1] <= bottom:
+                            del received[number][index]
+
+            return placements
+
+        # Header, a band per row of cards and whatever is left below
+        edges = {0, layout.height}
+        edges.update(min(edge, layout.height) for edge in layout.edges())
+        edges = sorted(edges)
+
+        start = perf_counter()
+
+        try:
+            # Only the encoded image is held in memory, which is much smaller
+            buffer = BytesIO()
+            writer = PNGWriter(
+                buffer, layout.width, layout.height, self.encoder.compress_level)
+
+            for top, bottom in zip(edges, edges[1:]):
+                band = Image.new("RGBA", (layout.width, bottom - top))
+                self.draw_background(band, background, top, layout.height)
+
+                if top == 0:
+                    self.draw_header(band, date)
+
+                self.draw_titles(band, layout, top)
+                self.paste_cards(band, take(top, bottom))
+
+                writer.write(band)
+
+            writer.close()
+            data, extension = buffer.getvalue(), "png"
+
+            if not self.encoder.accepts_png(len(data)):
+                # Formats, palettes and byte budgets need the whole image
+                log.info("Encoding the streamed Item Shop image again with the output settings")
+                with Image.open(BytesIO(data)) as image:
+                    data, extension = self.encoder.encode(image)
+
+            self.write_output(data, extension)
+        except Exception as error:
+            log.critical(f"Failed to save Item Shop image, {error}")
+            return False
+
+        log.info(
+            f"Rendered and encoded Item Shop image as {extension.upper()} in "
+            f"{perf_counter() - start:.2f}s, {len(self.output_data) / 1024:,.0f} KB"
+        )
+
+        self.save_caches()
+
+        log.info("Generated Item Shop image")
+        return True
+
+    def layout_image(self, date: str, sections: list) -> Layout:
+        """Return the layout of the Item Shop image of the provided sections of entries."""
+        titles = []
+        for index, ((_, title), entries) in enumerate(zip(SECTIONS, sections)):
+            # Titles of empty sections are only drawn by the classic layout
+            if len(entries) > 0 or (self.layout != "packed" and index < 2):
+                with metrics.timer("translate"):
+                    title = self.translation.text(title, self.language)
+
+            titles.append((title, len(entries), ImageUtil().text_width(title, 48)))
+
+        classic = classic_layout(titles)
+
+        if self.layout != "packed":
+            return classic
+
+        logo = ImageUtil().open_layer("logo.png")
+        date_width = ImageUtil().text_width(date, 48)
+
+        layout = packed_layout(
+            titles,
+            self.layout_columns,
+            self.layout_max_width,
+            max(int(logo.width * 210 / logo.height), date_width) + (2 * MARGIN),
+            date_width,
+        )
+
+        log.info(
+            f"Packed Item Shop image in {layout.width}x{layout.height}, "
+            f"{classic.pixels - layout.pixels:,} pixels less than the classic layout"
+        )
+        metrics.increment("layout_pixels_saved", classic.pixels - layout.pixels)
+
+        return layout
+
+    def write_output(self, data: bytes, extension: str) -> None:
+        """
+        Keep the encoded Item Shop image in memory for the uploader, and
+        write it to disk if enabled.
+        """
+        self.output_data = data
+        self.output_path = f"{self.output_name}.{extension}"
+
+        if self.save_output is True:
+            with open(self.output_path, "wb") as file:
+                file.write(data)
+
+    def paste_cards(self, image: Image.Image, placements: list) -> None:
+        """Paste the provided (card, position) placements onto the image."""
+        if self.compositor is not None:
+            self.compositor.paste_cards(image, placements)
+            return
+
+        for card, position in placements:
+            image.paste(card, position, card)
+
+    @staticmethod
+    def open_background():
+        """Return the background image, None if missing."""
+        try:
+            return ImageUtil().open_layer("background.png")
         except FileNotFoundError:
             log.warning(
                 "Failed to open background.png, defaulting to dark gray")
-            shop_image.paste(
-                (18, 18, 18), [0, 0, shop_image.size[0], shop_image.size[1]])
 
-        logo = ImageUtil().open_image("logo.png")
+    @staticmethod
+    def draw_background(image: Image.Image, background: Image.Image,
+                        top: int = 0, height: int = None) -> None:
+        """
+        Paste the provided background onto the image, which is the band
+        starting at `top` of an Item Shop image `height` pixels high.
+        """
+        if background is None:
+            image.paste((18, 18, 18), [0, 0, image.size[0], image.size[1]])
+            return
+
+        if height is None:
+            height = image.height
+
+        if top == 0 and image.height == height:
+            background = ImageUtil().resize_ratio(background, image.width, height)
+        else:
+            # Only resize the part of the background covered by the band
+            ratio = max(image.width / background.width, height / background.height)
+            background = background.resize(
+                (int(background.width * ratio), image.height),
+                Image.ANTIALIAS,
+                box=(0, top / ratio, background.width,
+                     (top + image.height) / ratio),
+            )
+
+        image.paste(
+            background, ImageUtil().align_center(image.width, background.width)
+        )
+
+    def draw_header(self, image: Image.Image, date: str) -> None:
+        """Draw the logo and the date onto the provided image."""
+        logo = ImageUtil().open_layer("logo.png")
         logo = ImageUtil().resize_ratio(logo, 0, 210)
-        shop_image.paste(
+        image.paste(
             logo, ImageUtil().align_center(
-                shop_image.width, logo.width, 20), logo
+                image.width, logo.width, 20), logo
         )
 
-        canvas = ImageDraw.Draw(shop_image)
+        canvas = ImageDraw.Draw(image)
 
         font = ImageUtil().get_font(48)
-        text_width, _ = font.getsize(date)
+        text_width = ImageUtil().text_width(date, 48)
         canvas.text(
-            ImageUtil().align_center(shop_image.width, text_width, 255),
+            ImageUtil().align_center(image.width, text_width, 255),
             date,
             (255, 255, 255),
             font=font,
         )
-        featured_title = Translator().translate(
-            "Featured", str='en', dest=self.language).text
-        daily_title = Translator().translate("Daily", str='en', dest=self.language).text
-
-        canvas.text((20, 255), featured_title, (255, 255, 255), font=font)
-        text_width, _ = font.getsize(daily_title)
-        canvas.text(
-            (shop_image.width - (text_width + 20), 255),
-            daily_title,
-            (255, 255, 255),
-            font=font,
-        )
 
-        # Track grid position
-        i = 0
+    @staticmethod
+    def draw_titles(image: Image.Image, layout: Layout, top: int = 0) -> None:
+        """
+        Draw the section titles of the provided layout onto the image, which
+        is the band starting at `top` of the Item Shop image.
+        """
+        canvas = ImageDraw.Draw(image)
+        font = ImageUtil().get_font(48)
 
-        for item in featured:
-            card = self.generate_card(item)
+        for section in layout.sections:
+            if section.title is None:
+                continue
 
-            if card is not None:
-                shop_image.paste(
-                    card,
-                    (
-                        (20 + ((i % 3) * (card.width + 5))),
-                        (315 + ((i // 3) * (card.height + 5))),
-                    ),
-                    card,
-                )
+            x, y = section.position
 
-                i += 1
+            if y - top < image.height and y - top + TITLE_HEIGHT > 0:
+                canvas.text((x, y - top), section.title, (255, 255, 255), font=font)
 
-        # Reset grid position
-        i = 0
+    def save_caches(self) -> None:
+        """Write the caches to disk for the next runs."""
+        with self.cache_lock:
+            if self.icon_cache is not None:
+                self.icon_cache.save()
+                ImageUtil().save_widths(
+                    os.path.join(Config.CACHE_DIRECTORY, "widths.json"))
 
-        for item in daily:
-            card = self.generate_card(item)
+            if self.card_store is not None:
+                self.card_store.save()
 
-            if card is not None:
-                shop_image.paste(
-                    card,
-                    (
-                        (990 + ((i % 3) * (card.width + 5))),
-                        (315 + ((i // 3) * (card.height + 5))),
-                    ),
-                    card,
-                )
+            if self.variant_store is not None:
+                self.variant_store.save()
 
-                i += 1
+    def generate_cards(self, entries: list):
+        """
+        Yield the card image of each provided entry in order, None for the
+        entries which failed to render.
 
-        try:
-            shop_image.save("itemshop.png")
-            log.info("Generated Item Shop image")
-            return True
-        except Exception as error:
-            log.critical(f"Failed to save Item Shop image, {error}")
-        return False
+        Entries found several times, in both sections for instance, are
+        only rendered once.
+        """
+        distinct = list(dict.fromkeys(entries))
+        metrics.increment("duplicate_entries", len(entries) - len(distinct))
 
-    def generate_card(self, item: dict):
-        """Return the card image for the provided Fortnite Item Shop item."""
+        # Cards kept until their last occurrence
+        remaining = Counter(entries)
+        cards = {}
+        rendered = self.generate_distinct_cards(distinct)
 
-        try:
-            name = item["items"][0]["name"]
-            rarity = item["items"][0]["rarity"]["value"]
-            category = item["items"][0]["type"]["value"]
-            price = item["finalPrice"]
+        for entry in entries:
+            card = cards[entry] if entry in cards else next(rendered)
 
-            if item["items"][0]["images"]["featured"] is not None:
-                icon = item["items"][0]["images"]["featured"]
+            remaining[entry] -= 1
+            if remaining[entry] > 0:
+                cards[entry] = card
             else:
-                icon = item["items"][0]["images"]["icon"]
+                cards.pop(entry, None)
 
-            # Select bundle image and name
-            if item["bundle"] is not None:
-                name = item["bundle"]["name"]
-                icon = item["bundle"]["image"]
+            yield card
 
-        except Exception as error:
-            log.error(f"Failed to parse item, {error}")
+    def generate_distinct_cards(self, entries: list):
+        """
+        Yield the card image of each provided entry in order, None for the
+        entries which failed to render.
+
+        Cards left unchanged since a previous run are reused from the card
+        store, only the others are rendered. Cards drawn with a placeholder
+        icon are not stored, so that the icon is downloaded again next run.
+        """
+        if self.card_store is None:
+            yield from self.render_cards(entries)
             return
 
-        # Should be outdated
-
-        if rarity == "frozen":
-            blend_color = (148, 223, 255)
-        elif rarity == "lava":
-            blend_color = (234, 141, 35)
-        elif rarity == "legendary":
-            blend_color = (211, 120, 65)
-        elif rarity == "dark":
-            blend_color = (251, 34, 223)
-        elif rarity == "starwars":
-            blend_color = (231, 196, 19)
-        elif rarity == "marvel":
-            blend_color = (197, 51, 52)
-        elif rarity == "dc":
-            blend_color = (84, 117, 199)
-        elif rarity == "icon":
-            blend_color = (54, 183, 183)
-        elif rarity == "shadow":
-            blend_color = (113, 113, 113)
-        elif rarity == "epic":
-            blend_color = (177, 91, 226)
-        elif rarity == "rare":
-            blend_color = (73, 172, 242)
-        elif rarity == "uncommon":
-            blend_color = (96, 170, 58)
-        elif rarity == "common":
-            blend_color = (190, 190, 190)
-        else:
-            blend_color = (255, 255, 255)
+        digests = [self.card_digest(entry) for entry in entries]
+        stored = [digest in self.card_store for digest in digests]
+        rendered = self.render_cards(
+            [entry for entry, found in zip(entries, stored) if not found]
+        )
 
-        card = Image.new("RGBA", (300, 545))
+        for entry, digest, found in zip(entries, digests, stored):
+            if found:
+                card = self.card_store.get(digest)
 
-        try:
-            layer = ImageUtil().open_image(
-                self.style + f"/card_top_{rarity}.png")
-        except FileNotFoundError:
-            log.warning(
-                f"Failed to open card_top_{rarity}.png, defaulted to Common")
-            layer = ImageUtil().open_image(f"{self.style}/card_top_common.png")
+                if card is None:
+                    # Unreadable, render it again
+                    card = next(self.render_cards([entry]))
+            else:
+                card = next(rendered)
 
-        card.paste(layer)
+                if card is not None and not card.info.get("placeholder"):
+                    self.card_store.put(digest, card)
 
-        icon = ImageUtil().download_image(icon).convert("RGBA")
-        if category in ["outfit", "emote"]:
-            icon = ImageUtil().resize_ratio(icon, 285, 365)
-        elif category == "wrap":
-            icon = ImageUtil().resize_ratio(icon, 230, 310)
-        else:
-            icon = ImageUtil().resize_ratio(icon, 310, 390)
-        if category in ["outfit", "emote"]:
-            card.paste(icon, ImageUtil().align_center(
-                card.width, icon.width), icon)
-        else:
-            card.paste(icon, ImageUtil().align_center(
-                card.width, icon.width, 15), icon)
+            yield card
+
+    def card_digest(self, entry: ShopEntry) -> str:
+        """Return a digest of everything which goes into the card of the provided entry."""
+        return hashlib.sha256(
+            f"{entry.digest}|{self.style}|{self.language}".encode()).hexdigest()
+
+    def render_cards(self, entries: list):
+        """
+        Yield the newly rendered card image of each provided entry in order,
+        None for the entries which failed to render.
+
+        Downloads, rendering and the consumer of the cards run as a
+        pipeline: the icons of the next entries are downloaded while the
+        current ones are rendered, and at most `pipeline_depth` entries are
+        in flight.
+        """
+        # Kept for the other targets of the run, released once used otherwise
+        shared = self.resized is not None
+        icons = self.icons if shared else {}
+        downloaded = self.download_icons(entries, icons)
+
+        for entry, card in self.render_downloaded(downloaded, icons):
+            if not shared:
+                for url in entry.icons:
+                    icons.pop(url, None)
+
+            yield card
 
-        if len(item["items"]) > 1:
-            # Track grid position
-            i = 0
+    def download_icons(self, entries: list, icons: dict):
+        """
+        Yield the provided entries in order, each once its icons are
+        downloaded into `icons` (url to raw file, None if failed). Downloads
+        run ahead of the consumer by at most `pipeline_depth` entries.
+        """
+        entries = iter(entries)
+        pending = deque()
+        # Downloads in flight, an icon shared by several entries is only
+        # downloaded once
+        started = {}
+
+        # Downloads count against the run of the calling thread
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, self.download_workers),
+            initializer=http.join_run,
+            initargs=(http.run,),
+        )
+
+        with executor:
+
+            def submit(entry: ShopEntry) -> None:
+                futures = []
+
+                for url in entry.icons:
+                    if url in icons:
+                        continue
+
+                    if url not in started:
+                        started[url] = executor.submit(
+                            ImageUtil().download_file, url, self.icon_cache)
+                    futures.append((url, started[url]))
+
+                pending.append((entry, futures))
+
+            for entry in islice(entries, max(1, self.pipeline_depth)):
+                submit(entry)
 
-            # Start at position 1 in items array
-            for extra in item["items"][1:]:
-                try:
-                    extra_rarity = extra["rarity"]['value']
-                    extra_icon = extra["images"]["smallIcon"]
-                except Exception as error:
-                    log.error(f"Failed to parse item {name}, {error}")
+            while pending:
+                entry, futures = pending.popleft()
 
+                for url, future in futures:
+                    try:
+                        icons[url] = future.result()
+                    except Exception as error:
+                        log.error(f"Failed to download {url}, {error}")
+                        icons[url] = None
+                    started.pop(url, None)
+
+                for next_entry in islice(entries, 1):
+                    submit(next_entry)
+
+                yield entry
+
+    def render_downloaded(self, downloaded, icons: dict):
+        """
+        Yield an (entry, card image) tuple for each entry yielded by
+        `downloaded` in order, the card None if it failed to render.
+        """
+        if self.render_workers == 0:
+            if self.compositor is None:
+                for entry in downloaded:
+                    yield entry, self.generate_card(entry, icons)
+                return
+
+            # Composited a batch of cards at a time
+            while True:
+                batch = list(islice(downloaded, BATCH_SIZE))
+
+                if len(batch) == 0:
                     return
 
-                try:
-                    layer = ImageUtil().open_image(
-                        self.style + f"/box_bottom_{extra_rarity}.png")
-                except FileNotFoundError:
-                    log.warning(
-                        f"Failed to open box_bottom_{extra_rarity}.png, defaulted to Common"
-                    )
-                    layer = ImageUtil().open_image(
-                        f"{self.style}/box_bottom_common.png")
-
-                card.paste(
-                    layer,
-                    (
-                        (card.width - (layer.width + 9)),
-                        (9 + ((i // 1) * layer.height)),
-                    ),
-                )
-
-                extra_icon = ImageUtil().download_image(extra_icon)
-                extra_icon = ImageUtil().resize_ratio(extra_icon, 75, 75)
-
-                card.paste(
-                    extra_icon,
-                    (
-                        (card.width - (layer.width + 9)),
-                        (9 + ((i // 1) * extra_icon.height)),
-                    ),
-                    extra_icon,
-                )
-
-                try:
-                    layer = ImageUtil().open_image(
-                        self.style + f"/box_faceplate_{extra_rarity}.png")
-                except FileNotFoundError:
-                    log.warning(
-                        f"Failed to open box_faceplate_{extra_rarity}.png, defaulted to Common"
-                    )
-                    layer = ImageUtil().open_image(
-                        f"{self.style}/box_faceplate_common.png")
-
-                card.paste(
-                    layer,
-                    (
-                        (card.width - (layer.width + 9)),
-                        (9 + ((i // 1) * layer.height)),
-                    ),
-                    layer,
-                )
-
-                i += 1
+                yield from zip(batch, self.generate_card_batch(batch, icons))
 
-        if self.style == 'old':
-            try:
-                layer = ImageUtil().open_image(
-                    self.style + f"/card_faceplate_{rarity}.png")
-            except FileNotFoundError:
-                log.warning(
-                    f"Failed to open card_faceplate_{rarity}.png, defaulted to Common")
-                layer = ImageUtil().open_image(
-                    f"{self.style}/card_faceplate_common.png")
+        if self.render_pool is None:
+            self.render_pool = ProcessPoolExecutor(
+                self.render_workers, initializer=init_worker)
 
-            card.paste(layer, layer)
+        futures = deque()
 
-        try:
-            layer = ImageUtil().open_image(
-                self.style + f"/card_bottom_{rarity}.png")
-        except FileNotFoundError:
-            log.warning(
-                f"Failed to open card_bottom_{rarity}.png, defaulted to Common")
-            layer = ImageUtil().open_image(
-                f"{self.style}/card_bottom_common.png")
+        for entry in downloaded:
+            futures.append((entry, self.render_pool.submit(
+                render_card,
+                self.style,
+                entry,
+                {url: icons.get(url) for url in entry.icons},
+            )))
+
+            if len(futures) >= max(1, self.pipeline_depth):
+                yield self.collect_card(*futures.popleft(), icons)
+
+        while futures:
+            yield self.collect_card(*futures.popleft(), icons)
+
+    def collect_card(self, entry: ShopEntry, future, icons: dict) -> tuple:
+        """
+        Return the (entry, card image) tuple of a card rendering process.
+        Icons it failed to decode are dropped from `icons` and the icon cache.
+        """
+        card = future.result()
+
+        if card is not None:
+            size, data, placeholder, undecodable = card
+            card = Image.frombytes("RGBA", size, data)
+
+            if placeholder:
+                card.info["placeholder"] = True
+
+            for url in undecodable:
+                self.drop_icon(icons, url)
+
+        return entry, card
+
+    def generate_card(self, entry: ShopEntry, icons: dict = None):
+        """
+        Return the card image for the provided Fortnite Item Shop entry.
+
+        Icons found in `icons` (url to raw file) are used instead of
+        being downloaded.
+        """
+        return self.generate_card_batch([entry], icons)[0]
+
+    @metrics.timed("generate_card")
+    def generate_card_batch(self, entries: list, icons: dict = None) -> list:
+        """
+        Return the card image of each provided Fortnite Item Shop entry.
+
+        Icons found in `icons` (url to raw file) are used instead of
+        being downloaded. Cards drawn with a placeholder icon are marked
+        as such by `card.info["placeholder"]`.
+        """
+
+        if icons is None:
+            icons = {}
+
+        layers = [self.card_layers(entry, icons) for entry in entries]
+        templates = [
+            ImageUtil().card_template(self.style, entry.rarity) for entry in entries
+        ]
+
+        if self.compositor is not None and entries:
+            cards = self.compositor.compose_cards(templates, layers)
+        else:
+            cards = []
+            for (base, frame), card_layers in zip(templates, layers):
+                card = base.copy()
+
+                for image, position, masked in card_layers:
+                    card.paste(image, position, image if masked else None)
+
+                for layer in frame:
+                    card.paste(layer, layer)
+
+                cards.append(card)
+
+        for card, card_layers in zip(cards, layers):
+            if any(image.info.get("placeholder") for image, _, _ in card_layers):
+                card.info["placeholder"] = True
+
+        return [self.draw_card_text(card, entry) for card, entry in zip(cards, entries)]
+
+    def card_layers(self, entry: ShopEntry, icons: dict) -> list:
+        """
+        Return the (image, position, masked) layers of the card of the
+        provided entry, pasted in order onto its frame.
+        """
+        layers = []
+
+        if entry.category in ["outfit", "emote"]:
+            icon = self.resized_icon(icons, entry.icon, 285, 365, True)
+        elif entry.category == "wrap":
+            icon = self.resized_icon(icons, entry.icon, 230, 310, True)
+        else:
+            icon = self.resized_icon(icons, entry.icon, 310, 390, True)
+        if entry.category in ["outfit", "emote"]:
+            layers.append((icon, ImageUtil().align_center(
+                CARD_SIZE[0], icon.width), True))
+        else:
+            layers.append((icon, ImageUtil().align_center(
+                CARD_SIZE[0], icon.width, 15), True))
+
+        # Track grid position
+        i = 0
 
-        card.paste(layer, layer)
+        for extra_rarity, extra_icon in entry.extras:
+            layer = ImageUtil().open_rarity_layer(
+                self.style, "box_bottom", extra_rarity)
+
+            layers.append((
+                layer,
+                (
+                    (CARD_SIZE[0] - (layer.width + 9)),
+                    (9 + ((i // 1) * layer.height)),
+                ),
+                False,
+            ))
+
+            extra_icon = self.resized_icon(icons, extra_icon, 75, 75)
+
+            layers.append((
+                extra_icon,
+                (
+                    (CARD_SIZE[0] - (layer.width + 9)),
+                    (9 + ((i // 1) * extra_icon.height)),
+                ),
+                True,
+            ))
+
+            layer = ImageUtil().open_rarity_layer(
+                self.style, "box_faceplate", extra_rarity)
+
+            layers.append((
+                layer,
+                (
+                    (CARD_SIZE[0] - (layer.width + 9)),
+                    (9 + ((i // 1) * layer.height)),
+                ),
+                True,
+            ))
+
+            i += 1
+
+        return layers
+
+    def draw_card_text(self, card: Image.Image, entry: ShopEntry) -> Image.Image:
+        """Draw the texts and the V-Bucks icon of the card of the provided entry."""
+        name = entry.name
+        rarity = entry.rarity
+        category = entry.category
+        price = entry.price
+        blend_color = ImageUtil().blend_color(rarity)
 
         canvas = ImageDraw.Draw(card)
 
         if self.style == 'old':
             font = ImageUtil().get_font(30)
-            text_width, _ = font.getsize(
-                f"{rarity.capitalize()} {category.capitalize()}")
+            text_width = ImageUtil().text_width(
+                f"{rarity.capitalize()} {category.capitalize()}", 30)
             canvas.text(
                 ImageUtil().align_center(card.width, text_width, 385),
                 f"{rarity.capitalize()} {category.capitalize()}",
@@ -372,11 +959,10 @@ class Athena:
                 font=font,
             )
 
-            vbucks = ImageUtil().open_image("vbucks.png")
-            vbucks = ImageUtil().resize_ratio(vbucks, 25, 25)
+            vbucks = ImageUtil().vbucks_icon(self.style)
 
             price = str(f"{price:,}")
-            text_width, _ = font.getsize(price)
+            text_width = ImageUtil().text_width(price, 30)
             canvas.text(
                 ImageUtil().align_center(
                     card.width, (text_width - vbucks.width), 495),
@@ -393,7 +979,7 @@ class Athena:
             )
 
             font = ImageUtil().get_font(56)
-            text_width, _ = font.getsize(name)
+            text_width = ImageUtil().text_width(name, 56)
             change = 0
             if text_width >= 270:
                 # Ensure that the item name does not overflow
@@ -409,11 +995,10 @@ class Athena:
         elif self.style == 'new':
             font = ImageUtil().get_font(33)
 
-            vbucks = ImageUtil().open_image("vbucks_card.png")
-            vbucks = ImageUtil().resize_ratio(vbucks, 49, 49)
+            vbucks = ImageUtil().vbucks_icon(self.style)
 
             price = str(f"{price:,}")
-            text_width, _ = font.getsize(price)
+            text_width = ImageUtil().text_width(price, 33)
             canvas.text(
                 ImageUtil().align_center(
                     card.width, ((text_width + 15) - vbucks.width), 450),
@@ -430,7 +1015,7 @@ class Athena:
             )
 
             font = ImageUtil().get_font(56)
-            text_width, _ = font.getsize(name)
+            text_width = ImageUtil().text_width(name, 56)
             change = 0
             if text_width >= 270:
                 # Ensure that the item name does not overflow
@@ -446,43 +1031,119 @@ class Athena:
 
         return card
 
-    def tweet(self, date: str):
+    def resized_icon(self, icons: dict, url: str, width: int, height: int,
+                     rgba: bool = False):
         """
-        Tweet the current `itemshop.png` local file to Twitter using the credentials provided
-        in `configuration.json`.
+        Return the icon of the specified url resized to fit `width` and
+        `height`, downloading it unless found in `icons`. Icons which failed
+        to download or to decode are replaced by a placeholder, marked as
+        such by `icon.info["placeholder"]`.
+
+        Resized icons are kept in the variant store for the next runs, and
+        in memory for the other targets of the run when there are several.
+        Placeholders are kept in neither, so that the icon is downloaded
+        again by the next run or render.
         """
+        key = (url, width, height, rgba)
 
-        try:
-            twitter_api = twitter.Api(
-                consumer_key=self.twitter_api_key,
-                consumer_secret=self.twitter_api_secret,
-                access_token_key=self.twitter_access_token,
-                access_token_secret=self.twitter_access_secret,
-            )
+        if self.resized is not None and key in self.resized:
+            return self.resized[key]
 
-            twitter_api.VerifyCredentials()
-        except Exception as twtter_error:
-            log.critical(
-                "Failed to authenticate with Twitter, {}".format(twtter_error))
-            return
+        if url not in icons:
+            icons[url] = ImageUtil().download_file(url, self.icon_cache)
 
-        body = f"#Fortnite Item Shop for {date}"
+        content = icons[url]
+        icon = None
 
-        if self.creator_code is not None:
-            body = f"{body}\n\nSupport-a-Creator Code: {self.creator_code}"
+        if content is not None:
+            try:
+                icon = self.downscaled_icon(content, width, height, rgba)
+            except OSError as error:
+                # Such as an error page served with HTTP 200
+                log.error(f"Failed to decode {url}, {error}")
+                self.drop_icon(icons, url)
 
-        try:
-            with open("itemshop.png", "rb") as shop_image:
-                twitter_api.PostUpdate(body, media=shop_image)
+        if icon is None:
+            log.warning(f"Failed to get {url}, using a placeholder")
+            metrics.increment("placeholder_icons")
+            icon = ImageUtil().resize_ratio(
+                ImageUtil().placeholder_icon(), width, height)
+            icon.info["placeholder"] = True
 
-            log.info("Tweeted Item Shop")
-        except Exception as error:
-            log.critical("Failed to Tweet Item Shop, {}".format(error))
+            return icon
+
+        if self.resized is not None:
+            self.resized[key] = icon
+
+        return icon
+
+    def downscaled_icon(self, content: bytes, width: int, height: int, rgba: bool):
+        """
+        Return the provided raw icon resized to fit `width` and `height`,
+        from the variant store when it was already resized by a previous run.
+        """
+        if self.variant_store is None:
+            return ImageUtil().downscale_icon(content, width, height, rgba)
+
+        digest = self.variant_store.digest(
+            content, width, height, f"{DOWNSCALE}-rgba" if rgba else DOWNSCALE)
+        icon = self.variant_store.get(digest)
+
+        if icon is None:
+            icon = ImageUtil().downscale_icon(content, width, height, rgba)
+            self.variant_store.put(digest, icon)
+
+        return icon
+
+    def drop_icon(self, icons: dict, url: str) -> None:
+        """
+        Forget the downloaded file of the specified icon, in `icons` and in
+        the icon cache, so that it is downloaded again.
+        """
+        icons[url] = None
+
+        if self.icon_cache is not None:
+            self.icon_cache.discard(url)
+
+    def tweet(self, date: str) -> bool:
+        """Tweet the last generated Item Shop image, return True if sucessfully tweeted."""
+        return self.publisher.tweet(self.output_data, self.output_path, date)
+
+
+# Athena instance of the current card rendering process
+worker = None
+
+
+def init_worker() -> None:
+    """Set up a card rendering process."""
+    global worker
+    worker = Athena()
+    # Tasks land on any process, there is little to share between them
+    worker.resized = None
+
+
+def render_card(style: str, entry: ShopEntry, icons: dict):
+    """
+    Generate the card of the provided entry in a card rendering process,
+    `icons` maps urls to raw files. Return the card as a (size, RGBA bytes,
+    drawn with a placeholder, urls of the icons which failed to decode) tuple.
+    """
+    downloaded = [url for url, content in icons.items() if content is not None]
+
+    worker.style = style
+    card = worker.generate_card(entry, icons)
+
+    if card is not None:
+        return (
+            card.size,
+            card.tobytes(),
+            bool(card.info.get("placeholder")),
+            [url for url in downloaded if icons[url] is None],
+        )
 
 
 if __name__ == "__main__":
-    try:
-        Athena().start()
-    except KeyboardInterrupt:
-        log.info("Exiting...")
-        sys.exit()
+    # Kept for existing schedulers, same as `python cli.py run`
+    from cli import main
+
+    main(["run"] + sys.argv[1:])
@@ -0,0 +1,209 @@
+"""
+Layouts of the Item Shop image, where its section titles and cards go.
+
+`classic_layout` is the original one, Featured and Daily side by side.
+`packed_layout` lays out every section of the combined endpoint in the image
+of the smallest area which fits within a width limit.
+"""
+from itertools import product
+from math import ceil
+
+from util import CARD_SIZE
+
+# Sections of the combined Item Shop endpoint and their titles, in the order
+# they are laid out
+SECTIONS = [
+    ("featured", "Featured"),
+    ("daily", "Daily"),
+    ("specialFeatured", "Special Featured"),
+    ("specialDaily", "Special Daily"),
+]
+
+MARGIN = 20  # Around the cards
+GAP = 5  # Between cards
+SECTION_GAP = 60  # Between the sections side by side
+HEADER = 315  # Logo and date, above the cards
+TITLE_TOP = 255  # Titles on the line of the date
+TITLE_HEIGHT = 60  # Titles above the cards of their section
+
+
+class Section:
+    """Section of the Item Shop image, with the position of every one of its cards."""
+
+    __slots__ = ("title", "position", "slots")
+
+    def __init__(self, title: str, position: tuple, slots: list):
+        self.title = title
+        self.position = position
+        self.slots = slots
+
+
+class Layout:
+    """
+    Size of the Item Shop image and the placement of its sections, one per
+    entry of SECTIONS. Sections which are not drawn have no title.
+    """
+
+    __slots__ = ("name", "width", "height", "sections")
+
+    def __init__(self, name: str, width: int, height: int, sections: list):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.sections = sections
+
+    def __repr__(self) -> str:
+        return f"Layout({self.name!r}, {self.width}x{self.height})"
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def edges(self) -> list:
+        """Return the top and bottom of every row of cards, including the gap below it."""
+        edges = set()
+        for section in self.sections:
+            for _, y in section.slots:
+                edges.update((y, y + CARD_SIZE[1] + GAP))
+
+        return sorted(edges)
+
+
+def grid(left: int, top: int, columns: int, cards: int) -> list:
+    """Return the position of the provided count of cards, laid out in rows."""
+    return [
+        (
+            left + ((i % columns) * (CARD_SIZE[0] + GAP)),
+            top + ((i // columns) * (CARD_SIZE[1] + GAP)),
+        )
+        for i in range(cards)
+    ]
+
+
+def classic_layout(sections: list, width: int = 1920) -> Layout:
+    """
+    Return the original layout, Featured on the left and Daily on the right
+    in 3 columns each. The other sections are left out.
+
+    `sections` holds the (title, count of cards, title width) of every
+    section of SECTIONS.
+    """
+    (featured, featured_cards, _), (daily, daily_cards, daily_width) = sections[:2]
+    rows = max(ceil(featured_cards / 3), ceil(daily_cards / 3))
+
+    placed = [
+        Section(featured, (20, TITLE_TOP), grid(20, HEADER, 3, featured_cards)),
+        Section(
+            daily,
+            (width - (daily_width + 20), TITLE_TOP),
+            grid(990, HEADER, 3, daily_cards),
+        ),
+    ]
+    placed += [Section(None, None, []) for _ in sections[2:]]
+
+    return Layout("classic", width, (545 * rows) + 340, placed)
+
+
+def packed_layout(sections: list, columns: int, max_width: int, min_width: int,
+                  date_width: int) -> Layout:
+    """
+    Return the layout of the smallest area which is `columns` cards wide,
+    fewer if the sections have less cards or they do not fit in `max_width`.
+    Empty sections are left out.
+
+    The sections are split into stacks side by side, the sections of a stack
+    one below the other with the same number of columns. The image is at
+    least `min_width` wide, and titles which do not collide with the
+    `date_width` wide date are drawn on its line.
+
+    `sections` holds the (title, count of cards, title width) of every
+    section of SECTIONS.
+    """
+    drawn = [index for index, (_, cards, _) in enumerate(sections) if cards > 0]
+    best = arrange(sections, [], [], min_width, date_width)
+
+    if not drawn:
+        return best
+
+    best = None
+
+    # Stacks keep the sections in order, every gap between two sections
+    # either splits them into two stacks or not
+    for splits in range(2 ** (len(drawn) - 1)):
+        stacks = [[]]
+        for position, index in enumerate(drawn):
+            if position > 0 and splits & (1 << (position - 1)):
+                stacks.append([])
+            stacks[-1].append(index)
+
+        # A stack needs no more columns than the cards of its largest section
+        largest = [max(sections[index][1] for index in stack) for stack in stacks]
+        fitting = (
+            max_width - (2 * MARGIN) - (SECTION_GAP * (len(stacks) - 1)) + (GAP * len(stacks))
+        ) // (CARD_SIZE[0] + GAP)
+        total = max(len(stacks), min(columns, sum(largest), fitting))
+
+        for stack_columns in product(*[range(1, min(total, cards) + 1) for cards in largest]):
+            if sum(stack_columns) != total:
+                continue
+
+            layout = arrange(sections, stacks, stack_columns, min_width, date_width)
+
+            if best is None or score(layout, max_width) < score(best, max_width):
+                best = layout
+
+    return best
+
+
+def score(layout: Layout, max_width: int) -> tuple:
+    """Return the sort key of the provided layout, layouts which fit first."""
+    return (max(0, layout.width - max_width), layout.pixels, layout.height)
+
+
+def arrange(sections: list, stacks: list, stack_columns: list, min_width: int,
+            date_width: int) -> Layout:
+    """Return the layout of the provided stacks of sections, by index."""
+    widths = [
+        max(
+            columns * (CARD_SIZE[0] + GAP) - GAP,
+            *(sections[index][2] for index in stack),
+        )
+        for stack, columns in zip(stacks, stack_columns)
+    ]
+    content = sum(widths) + (SECTION_GAP * max(0, len(stacks) - 1))
+    width = max(min_width, content + (2 * MARGIN))
+
+    date_left = ((width - date_width) // 2) - MARGIN
+    date_right = ((width + date_width) // 2) + MARGIN
+
+    placed = [Section(None, None, []) for _ in sections]
+    left = (width - content) // 2
+    height = HEADER + MARGIN
+
+    for position, (stack, columns, stack_width) in enumerate(zip(stacks, stack_columns, widths)):
+        top = HEADER
+
+        for index in stack:
+            title, cards, title_width = sections[index]
+            title_left = left
+
+            if position == len(stacks) - 1 and position > 0:
+                # Right aligned, like the Daily title of the classic layout
+                title_left = left + stack_width - title_width
+
+            collides = title_left < date_right and title_left + title_width > date_left
+
+            if top == HEADER and not collides:
+                title_top = TITLE_TOP
+            else:
+                title_top = top
+                top += TITLE_HEIGHT
+
+            placed[index] = Section(
+                title, (title_left, title_top), grid(left, top, columns, cards))
+            top += (ceil(cards / columns) * (CARD_SIZE[1] + GAP)) - GAP + MARGIN
+
+        height = max(height, top)
+        left += stack_width + SECTION_GAP
+
+    return Layout("packed", width, height, placed)
@@ -0,0 +1,153 @@
+import functools
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from time import perf_counter, strftime, thread_time, time
+
+log = logging.getLogger(__name__)
+
+
+class Metrics:
+    """Stage durations and counters of the current run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the recorded values, at the start of every run."""
+        with self.lock:
+            self.started = time()
+            self.stages = {}
+            self.counters = {}
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Record the time spent in the wrapped block under `stage`."""
+        start, cpu = perf_counter(), thread_time()
+
+        try:
+            yield
+        finally:
+            wall, cpu = perf_counter() - start, thread_time() - cpu
+
+            with self.lock:
+                totals = self.stages.setdefault(
+                    stage, {"calls": 0, "seconds": 0.0, "cpu_seconds": 0.0})
+                totals["calls"] += 1
+                totals["seconds"] += wall
+                totals["cpu_seconds"] += cpu
+
+    def timed(self, stage: str):
+        """Decorator recording the time spent in the function under `stage`."""
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @contextmanager
+    def record(self, directory: str, profile: bool = False):
+        """
+        Record the wrapped run from scratch and write it to `directory`
+        when provided, along with a cProfile dump when `profile` is True.
+        """
+        self.reset()
+
+        profiler = None
+        if profile is True:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        try:
+            with self.timer("run"):
+                yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+
+                os.makedirs("profiles", exist_ok=True)
+                path = os.path.join("profiles", strftime("athena-%Y%m%d-%H%M%S.prof"))
+                profiler.dump_stats(path)
+                log.info(f"Saved profile to {path}")
+
+            if directory:
+                self.write(directory)
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def summary(self) -> dict:
+        """Return the recorded values of the current run."""
+        with self.lock:
+            return {
+                "started": self.started,
+                "stages": {stage: dict(totals) for stage, totals in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def prometheus(self, period: str = "in the last run") -> str:
+        """
+        Return the recorded values in the Prometheus text format, `period`
+        tells what they were recorded over in the help texts.
+        """
+        summary = self.summary()
+        lines = [
+            "# HELP athena_last_run_timestamp_seconds Time the values are recorded from.",
+            "# TYPE athena_last_run_timestamp_seconds gauge",
+            f"athena_last_run_timestamp_seconds {summary['started']:.3f}",
+            f"# HELP athena_stage_seconds Time spent in each stage {period}.",
+            "# TYPE athena_stage_seconds gauge",
+        ]
+        for stage, totals in summary["stages"].items():
+            lines.append(f'athena_stage_seconds{{stage="{stage}"}} {totals["seconds"]:.6f}')
+
+        lines += [
+            f"# HELP athena_stage_calls Calls of each stage {period}.",
+            "# TYPE athena_stage_calls gauge",
+        ]
+        for stage, totals in summary["stages"].items():
+            lines.append(f'athena_stage_calls{{stage="{stage}"}} {totals["calls"]}')
+
+        for counter, value in summary["counters"].items():
+            lines += [
+                f"# TYPE athena_{counter} gauge",
+                f"athena_{counter} {value}",
+            ]
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str) -> None:
+        """
+        Write the recorded values to `metrics.json` and to the `athena.prom`
+        Prometheus textfile in the specified directory.
+        """
+        try:
+            os.makedirs(directory, exist_ok=True)
+
+            for filename, content in [
+                ("metrics.json", json.dumps(self.summary(), indent=2)),
+                ("athena.prom", self.prometheus()),
+            ]:
+                path = os.path.join(directory, filename)
+
+                # Written atomically, collectors may read it at any time
+                with open(f"{path}.tmp", "w") as file:
+                    file.write(content)
+                os.replace(f"{path}.tmp", path)
+        except Exception as error:
+            log.warning(f"Failed to write metrics, {error}")
+
+
+# Shared by every module, so that the whole run is recorded in one place
+metrics = Metrics()
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class ShopEntry:
+    """
+    Entry of the Item Shop, parsed from the fortnite-api.com payload with
+    only what its card is made of.
+
+    `extras` holds a (rarity, small icon url) tuple for every item of the
+    entry after the first one. Entries with the same content have the same
+    `digest`, they compare and hash equal.
+    """
+
+    __slots__ = ("name", "rarity", "category", "price", "icon", "extras", "digest")
+
+    def __init__(self, name: str, rarity: str, category: str, price: int,
+                 icon: str, extras: tuple):
+        self.name = name
+        self.rarity = rarity
+        self.category = category
+        self.price = price
+        self.icon = icon
+        self.extras = extras
+        self.digest = hashlib.sha256(json.dumps(
+            [name, rarity, category, price, icon, extras]).encode()).hexdigest()
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ShopEntry) and self.digest == other.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __repr__(self) -> str:
+        return f"ShopEntry({self.name!r}, {self.rarity!r}, {self.category!r}, {self.price!r})"
+
+    @property
+    def icons(self) -> list:
+        """Return the url of every icon of the entry."""
+        return [self.icon] + [icon for _, icon in self.extras]
+
+    @classmethod
+    def parse(cls, entry: dict):
+        """Return the provided Item Shop entry parsed, None if malformed."""
+        try:
+            item = entry["items"][0]
+
+            name = item["name"]
+            icon = item["images"]["featured"] or item["images"]["icon"]
+
+            # Select bundle image and name
+            if entry["bundle"] is not None:
+                name = entry["bundle"]["name"]
+                icon = entry["bundle"]["image"]
+
+            parsed = cls(
+                validate(name, str, "name"),
+                validate(item["rarity"]["value"], str, "rarity"),
+                validate(item["type"]["value"], str, "type"),
+                validate(entry["finalPrice"], int, "finalPrice"),
+                validate(icon, str, "icon"),
+                tuple(
+                    (
+                        validate(extra["rarity"]["value"], str, "rarity"),
+                        validate(extra["images"]["smallIcon"], str, "smallIcon"),
+                    )
+                    for extra in entry["items"][1:]
+                ),
+            )
+        except Exception as error:
+            log.error(f"Failed to parse item, {error}")
+            return
+
+        return parsed
+
+    @classmethod
+    def parse_section(cls, section: dict) -> list:
+        """Return the entries of the provided Item Shop section, skipping malformed ones."""
+        if section is None:
+            return []
+
+        entries = [cls.parse(entry) for entry in section["entries"]]
+        return [entry for entry in entries if entry is not None]
+
+
+def validate(value, expected: type, field: str):
+    """Return the provided value, raise a ValueError if not of the expected type."""
+    if not isinstance(value, expected) or isinstance(value, bool) or value == "":
+        raise ValueError(f"invalid {field} {value!r}")
+
+    return value
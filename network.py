@@ -0,0 +1,187 @@
+import logging
+import threading
+from random import uniform
+from time import monotonic, sleep
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+from configuration import Config
+
+log = logging.getLogger(__name__)
+
+# Worth trying again, anything else is final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Seconds slept before the first retry, doubled on every attempt
+BACKOFF = 0.5
+BACKOFF_MAX = 8
+
+
+class Run:
+    """
+    Deadline and retry budget of a run, shared by every request it makes:
+    the run ends `deadline` seconds after it started, and retries at most
+    `retry_budget` times in total.
+    """
+
+    def __init__(self, deadline: float, retry_budget: int):
+        self.started = monotonic()
+        self.deadline = deadline
+        self.retries_left = retry_budget
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        """Return the seconds left before the run deadline, None without deadline."""
+        if not self.deadline:
+            return
+
+        return self.deadline - (monotonic() - self.started)
+
+    def take_retry(self) -> bool:
+        """Return True if the retry budget of the run allows another retry."""
+        with self.lock:
+            if self.retries_left <= 0:
+                return False
+
+            self.retries_left -= 1
+            return True
+
+
+class HttpClient:
+    """
+    HTTP client shared by every request.
+
+    Connections are kept alive in a pool, every request is bounded by
+    `timeout` and the whole run by `deadline` seconds. Network errors, HTTP
+    429 and 5xx responses are retried with a jittered exponential backoff,
+    at most `retries` times per request and `retry_budget` times per run.
+
+    Runs are started by `start_run` and belong to the thread which started
+    them, so that concurrent runs each have their own deadline and retry
+    budget. Threads downloading on behalf of a run join it with `join_run`.
+    Requests made outside of any run share a run without deadline.
+    """
+
+    def __init__(self, pool_size: int, timeout: float, retries: int,
+                 retry_budget: int, deadline: float):
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_budget = retry_budget
+        self.deadline = deadline
+        self.local = threading.local()
+        self.default_run = Run(None, retry_budget)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def start_run(self) -> Run:
+        """Start a new run for the requests of the current thread and return it."""
+        run = Run(self.deadline, self.retry_budget)
+        self.join_run(run)
+        return run
+
+    def join_run(self, run: Run) -> None:
+        """Count the requests of the current thread against the provided run."""
+        self.local.run = run
+
+    @property
+    def run(self) -> Run:
+        """Return the run of the current thread."""
+        return getattr(self.local, "run", self.default_run)
+
+    def get(self, url: str, params: dict = None, headers: dict = None):
+        """
+        Return the response of an HTTP GET request to the specified url,
+        retried while it fails with a retryable error. Return None if no
+        response was received.
+        """
+        return self.request("GET", url, params=params, headers=headers)
+
+    @metrics.timed("fetch")
+    def get_json(self, url: str, params: dict = None):
+        """
+        Return the JSON body of a successful HTTP GET request to the
+        specified url, None if it failed.
+        """
+        res = self.get(url, params=params)
+
+        if res is None:
+            log.critical(f"Failed to GET {url}")
+        # HTTP 200 (OK)
+        elif res.status_code == 200:
+            return res.json()
+        else:
+            log.critical(f"Failed to GET {url} (HTTP {res.status_code})")
+
+    def post(self, url: str, json=None, timeout: float = None):
+        """
+        Return the response of an HTTP POST request of the provided JSON
+        body, retried like `get`, which must only be used for idempotent
+        requests. `timeout` replaces the client timeout.
+        """
+        return self.request("POST", url, json=json, timeout=timeout)
+
+    def request(self, method: str, url: str, params: dict = None, headers: dict = None,
+                json=None, timeout: float = None):
+        """Return the response of the provided HTTP request, see `get`."""
+        if timeout is None:
+            timeout = self.timeout
+
+        run = self.run
+
+        for attempt in range(self.retries + 1):
+            attempt_timeout = timeout
+            remaining = run.remaining()
+
+            if remaining is not None:
+                if remaining <= 0:
+                    log.critical(f"Run deadline exceeded, skipped {method} {url}")
+                    return
+
+                attempt_timeout = min(timeout, remaining)
+
+            res = None
+            try:
+                res = self.session.request(
+                    method, url, params=params, headers=headers, json=json,
+                    timeout=attempt_timeout)
+                metrics.increment("http_requests")
+                metrics.increment("bytes_downloaded", len(res.content))
+
+                if res.status_code not in RETRY_STATUSES:
+                    return res
+
+                reason = f"HTTP {res.status_code}"
+            except requests.RequestException as error:
+                reason = str(error)
+
+            if attempt == self.retries or not run.take_retry():
+                log.error(f"Failed to {method} {url}, {reason}")
+                return res
+
+            delay = min(BACKOFF_MAX, BACKOFF * (2 ** attempt)) * uniform(0.5, 1.5)
+            if res is not None and res.headers.get("Retry-After", "").isdigit():
+                delay = min(BACKOFF_MAX, int(res.headers["Retry-After"]))
+
+            remaining = run.remaining()
+            if remaining is not None and delay >= remaining:
+                log.error(f"Failed to {method} {url}, {reason}, no time left to retry")
+                return res
+
+            log.warning(f"Failed to {method} {url}, {reason}, retrying in {delay:.1f}s")
+            metrics.increment("http_retries")
+            sleep(delay)
+
+
+# Shared by every module, so that every request reuses the same connections
+http = HttpClient(
+    Config.DOWNLOAD_WORKERS,
+    Config.HTTP_TIMEOUT,
+    Config.HTTP_RETRIES,
+    Config.HTTP_RETRY_BUDGET,
+    Config.HTTP_RUN_DEADLINE,
+)
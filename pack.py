@@ -0,0 +1,199 @@
+"""
+Asset packs, the layers of a style decoded ahead of time into a single file.
+
+    python cli.py pack new
+
+A pack starts with a JSON manifest listing every layer of the style and the
+shared layers of assets/images/ along with the hash of its source file,
+followed by the layers as raw RGBA pixels at the offsets it records. It is
+memory-mapped, so that opening a layer neither decodes nor copies it, and
+the processes rendering cards share its pages.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"ATHENAPK"
+VERSION = 1
+# Magic and length of the manifest
+HEADER = struct.Struct("<8sI")
+# Offsets of the layers are multiples of this
+ALIGNMENT = 64
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def table_hash(blend_colors: dict) -> str:
+    return hashlib.sha256(json.dumps(blend_colors, sort_keys=True).encode()).hexdigest()
+
+
+class AssetPack:
+    """
+    Memory-mapped pack of the layers of a style, opened by `AssetPack.open`.
+    The layers it returns are read-only views of the pack.
+    """
+
+    def __init__(self, path: str, manifest: dict, buffer: mmap.mmap):
+        self.path = path
+        self.manifest = manifest
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.layers = manifest["layers"]
+        self.blend_colors = {
+            rarity: tuple(color) for rarity, color in manifest["blend_colors"].items()
+        }
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.layers
+
+    def __len__(self) -> int:
+        return len(self.layers)
+
+    @staticmethod
+    def sources(style: str) -> dict:
+        """Return the path of every layer of the provided style, by filename."""
+        sources = {}
+
+        for directory, prefix in [("assets/images", ""), (f"assets/images/{style}", f"{style}/")]:
+            for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+                if entry.is_file() and entry.name.endswith(".png"):
+                    sources[f"{prefix}{entry.name}"] = entry.path
+
+        return sources
+
+    @staticmethod
+    def build(style: str, path: str, blend_colors: dict) -> dict:
+        """Write the pack of the provided style to `path`, return its manifest."""
+        layers = {}
+        pixels = []
+        offset = 0
+
+        for filename, source in AssetPack.sources(style).items():
+            stat = os.stat(source)
+
+            with Image.open(source) as image:
+                data = image.convert("RGBA").tobytes()
+                size = image.size
+
+            layers[filename] = {
+                "size": list(size),
+                "offset": offset,
+                "length": len(data),
+                "sha256": file_hash(source),
+                "stat": [stat.st_size, stat.st_mtime_ns],
+            }
+            pixels.append(data)
+            offset += -(-len(data) // ALIGNMENT) * ALIGNMENT
+
+        manifest = {
+            "version": VERSION,
+            "style": style,
+            "layers": layers,
+            "blend_colors": blend_colors,
+            "blend_colors_sha256": table_hash(blend_colors),
+        }
+        encoded = json.dumps(manifest).encode()
+        start = -(-(HEADER.size + len(encoded)) // ALIGNMENT) * ALIGNMENT
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(HEADER.pack(MAGIC, len(encoded)))
+            file.write(encoded)
+
+            for layer, data in zip(layers.values(), pixels):
+                file.seek(start + layer["offset"])
+                file.write(data)
+
+        os.replace(f"{path}.tmp", path)
+
+        log.info(f"Packed {len(layers)} layers of {style} into {path}")
+        return manifest
+
+    @staticmethod
+    def open(path: str, style: str, blend_colors: dict):
+        """
+        Return the pack found at `path`, None if it is missing, unreadable or
+        stale, the layers are then opened from their files.
+        """
+        try:
+            with open(path, "rb") as file:
+                magic, length = HEADER.unpack(file.read(HEADER.size))
+
+                if magic != MAGIC:
+                    raise ValueError("not an asset pack")
+
+                manifest = json.loads(file.read(length))
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            log.debug(f"Asset pack {path} not found, build it with `python cli.py pack {style}`")
+            return
+        except Exception as error:
+            log.warning(f"Failed to open asset pack {path}, {error}")
+            return
+
+        reason = AssetPack.stale(manifest, style, blend_colors)
+
+        if reason is not None:
+            log.warning(
+                f"Asset pack {path} is stale ({reason}), rebuild it with "
+                f"`python cli.py pack {style}`"
+            )
+            buffer.close()
+            return
+
+        # The layers follow the manifest, at the next aligned offset
+        start = -(-(HEADER.size + length) // ALIGNMENT) * ALIGNMENT
+        for layer in manifest["layers"].values():
+            layer["offset"] += start
+
+        if any(layer["offset"] + layer["length"] > len(buffer)
+               for layer in manifest["layers"].values()):
+            log.warning(f"Failed to open asset pack {path}, truncated")
+            buffer.close()
+            return
+
+        return AssetPack(path, manifest, buffer)
+
+    @staticmethod
+    def stale(manifest: dict, style: str, blend_colors: dict):
+        """
+        Return why the provided manifest no longer matches the assets, None
+        if it does. Files are only hashed when their size or modification
+        time changed.
+        """
+        if manifest.get("version") != VERSION or manifest.get("style") != style:
+            return "different version"
+        if manifest.get("blend_colors_sha256") != table_hash(blend_colors):
+            return "blend colors changed"
+
+        sources = AssetPack.sources(style)
+        layers = manifest["layers"]
+
+        if sources.keys() != layers.keys():
+            return "layers added or removed"
+
+        for filename, source in sources.items():
+            stat = os.stat(source)
+
+            if layers[filename]["stat"] == [stat.st_size, stat.st_mtime_ns]:
+                continue
+            if layers[filename]["sha256"] != file_hash(source):
+                return f"{filename} changed"
+
+    def layer(self, filename: str):
+        """Return the specified layer as an RGBA image backed by the pack."""
+        layer = self.layers[filename]
+        data = self.view[layer["offset"]:layer["offset"] + layer["length"]]
+
+        return Image.frombuffer("RGBA", tuple(layer["size"]), data, "raw", "RGBA", 0, 1)
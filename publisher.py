@@ -0,0 +1,120 @@
+import logging
+import os
+from io import BytesIO
+
+from metrics import metrics
+from configuration import Config, TwitterConfig
+
+log = logging.getLogger(__name__)
+
+
+class MediaBuffer(BytesIO):
+    """Encoded image held in memory, uploaded by python-twitter as an opened file."""
+
+    # python-twitter checks the mode, and guesses the media type from the name
+    mode = "rb"
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+class Publisher:
+    """
+    Tweet the generated Item Shop images.
+
+    Kept apart from the image generation, so that tweeting an image which
+    is already rendered does not load the imaging dependencies, nor
+    rendering one the Twitter client.
+
+    The Twitter client is authenticated once and reused by the following
+    tweets, until one of them fails.
+    """
+
+    def __init__(self) -> None:
+        self.creator_code = Config.CREATOR_CODE
+        self.api_key = TwitterConfig.API_KEY
+        self.api_secret = TwitterConfig.API_SECRET
+        self.access_token = TwitterConfig.ACCESS_TOKEN
+        self.access_secret = TwitterConfig.ACCESS_SECRET
+        self.chunk_size = TwitterConfig.CHUNK_SIZE
+        self.api_url = TwitterConfig.API_URL or None
+        self.upload_url = TwitterConfig.UPLOAD_URL or None
+        self.api = None
+
+    def client(self):
+        """Return the authenticated Twitter client, created on first use."""
+        if self.api is None:
+            import twitter
+
+            api = twitter.Api(
+                consumer_key=self.api_key,
+                consumer_secret=self.api_secret,
+                access_token_key=self.access_token,
+                access_token_secret=self.access_secret,
+                base_url=self.api_url,
+                upload_url=self.upload_url,
+                chunk_size=self.chunk_size,
+            )
+
+            api.VerifyCredentials()
+            self.api = api
+
+        return self.api
+
+    def tweet_file(self, path: str, date: str) -> bool:
+        """
+        Tweet the Item Shop image found at `path`.
+
+        Return True if sucessfully tweeted.
+        """
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except Exception as error:
+            log.critical(f"Failed to read {path}, {error}")
+            return False
+
+        return self.tweet(data, path, date)
+
+    @metrics.timed("tweet")
+    def tweet(self, data: bytes, filename: str, date: str) -> bool:
+        """
+        Tweet the provided encoded Item Shop image to Twitter using the
+        credentials provided in `configuration.py`, its type is guessed
+        from `filename`.
+
+        Return True if sucessfully tweeted.
+        """
+        try:
+            twitter_api = self.client()
+        except Exception as twtter_error:
+            log.critical(
+                "Failed to authenticate with Twitter, {}".format(twtter_error))
+            return False
+
+        body = f"#Fortnite Item Shop for {date}"
+
+        if self.creator_code is not None:
+            body = f"{body}\n\nSupport-a-Creator Code: {self.creator_code}"
+
+        try:
+            media = MediaBuffer(data, os.path.basename(filename))
+
+            if len(data) > self.chunk_size:
+                media_id = twitter_api.UploadMediaChunked(media, media_category="tweet_image")
+            else:
+                media_id = twitter_api.UploadMediaSimple(media)
+
+            metrics.increment("bytes_uploaded", len(data))
+
+            twitter_api.PostUpdate(body, media=media_id)
+
+            log.info("Tweeted Item Shop")
+            return True
+        except Exception as error:
+            log.critical("Failed to Tweet Item Shop, {}".format(error))
+
+        # Authenticated again by the next tweet, in case the session expired
+        self.api = None
+        return False
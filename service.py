@@ -0,0 +1,277 @@
+"""
+Athena render service
+
+Renders Item Shop images and cards over HTTP for several bots, so that
+they share a single warm process: the assets, fonts, downloaded and resized
+icons are kept in memory, and the icon cache and card store on disk.
+
+    POST /image   {"shop": {...}, "style": "new", "language": "en"}
+    POST /card    {"entry": {...}, "style": "new", "language": "en"}
+    GET  /health
+    GET  /metrics
+"""
+import copy
+import json
+import logging
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import time
+
+from cache import MemoryCache
+from encoder import CONTENT_TYPES, Encoder
+from itemshop import Athena, init_worker
+from metrics import metrics
+from model import ShopEntry
+from network import http
+from configuration import Config
+
+log = logging.getLogger(__name__)
+
+# Largest request body accepted, in bytes
+MAX_BODY = 16 * 1024 * 1024
+
+
+class RenderError(Exception):
+    """Request which can not be rendered, answered with the HTTP `status`."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RenderService(ThreadingHTTPServer):
+    """
+    HTTP server rendering with at most `workers` concurrent renders, each by
+    its own Athena instance. The instances share their caches, requests
+    waiting more than `queue_timeout` seconds for one are answered with
+    HTTP 503.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, workers: int, queue_timeout: float):
+        super().__init__((host, port), RenderHandler)
+        self.queue_timeout = queue_timeout
+        self.started = time()
+        self.icons = MemoryCache(
+            Config.SERVICE_ICON_MEMORY, lambda content: len(content or b""))
+        self.resized = MemoryCache(
+            Config.SERVICE_RESIZED_MEMORY,
+            lambda icon: icon.width * icon.height * len(icon.getbands()),
+        )
+
+        athena = Athena()
+        # Images are returned, neither tweeted nor written to disk
+        athena.twitter_enabled = False
+        athena.save_output = False
+        athena.snapshots = None
+
+        if athena.render_workers > 0:
+            # Shared by every instance, rather than a pool each
+            athena.render_pool = ProcessPoolExecutor(
+                athena.render_workers, initializer=init_worker)
+
+        self.renderers = queue.Queue()
+        for _ in range(max(1, workers)):
+            renderer = copy.copy(athena)
+            renderer.rendered = []
+            self.renderers.put(renderer)
+
+        self.workers = self.renderers.qsize()
+        self.athena = athena
+
+    def render(self, request: dict, function):
+        """
+        Return the result of calling `function` with a free Athena instance
+        set up for the style and language of the request.
+        """
+        style = request.get("style", Config.STYLE)
+        language = request.get("language", Config.LANGUAGE)
+
+        styles = [entry.name for entry in os.scandir("assets/images") if entry.is_dir()]
+
+        if style not in styles:
+            raise RenderError(400, f"Unknown style {style!r}")
+        if not isinstance(language, str):
+            raise RenderError(400, f"Invalid language {language!r}")
+
+        try:
+            renderer = self.renderers.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            metrics.increment("service_busy")
+            raise RenderError(503, "Every renderer is busy")
+
+        try:
+            # Every render is a run of its own, with its own retry budget and deadline
+            http.start_run()
+
+            renderer.style = style
+            renderer.language = language
+            renderer.date_language = request.get("date_language", language)
+            renderer.icons = self.icons.view()
+            renderer.resized = self.resized.view()
+
+            return function(renderer)
+        finally:
+            renderer.icons = {}
+            renderer.resized = None
+            self.renderers.put(renderer)
+
+    def render_image(self, request: dict) -> tuple:
+        """Return the encoded Item Shop image of the request, and its file extension."""
+        shop = request.get("shop")
+
+        if isinstance(shop, dict) and isinstance(shop.get("data"), dict):
+            # The whole fortnite-api.com response
+            shop = shop["data"]
+
+        if not isinstance(shop, dict) or not isinstance(shop.get("date"), str):
+            raise RenderError(400, "Missing Item Shop")
+
+        # Strip time from the timestamp, we only need the date
+        day = shop["date"].split("T")[0]
+
+        try:
+            datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            raise RenderError(400, f"Invalid Item Shop date {shop['date']!r}")
+
+        def generate(renderer: Athena) -> tuple:
+            date = renderer.translation.date(day, renderer.date_language)
+
+            if renderer.generate_image(date, shop) is not True:
+                raise RenderError(500, "Failed to generate Item Shop image")
+
+            return renderer.output_data, renderer.output_path.rsplit(".", 1)[-1]
+
+        return self.render(request, generate)
+
+    def render_card(self, request: dict) -> tuple:
+        """Return the card of the Item Shop entry of the request encoded as PNG."""
+        entry = ShopEntry.parse(request.get("entry") or {})
+
+        if entry is None:
+            raise RenderError(400, "Invalid Item Shop entry")
+
+        def generate(renderer: Athena) -> tuple:
+            card = next(renderer.generate_cards([entry]))
+
+            if card is None:
+                raise RenderError(500, "Failed to generate card")
+
+            return Encoder.encode_png(card, renderer.encoder.compress_level), "png"
+
+        return self.render(request, generate)
+
+    def health(self) -> dict:
+        """Return the state of the service."""
+        return {
+            "status": "ok",
+            "uptime": time() - self.started,
+            "workers": self.workers,
+            "idle": self.renderers.qsize(),
+            "icons": len(self.icons),
+            "resized_icons": len(self.resized),
+        }
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args) -> None:
+        log.debug(format % args)
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self.respond(200, json.dumps(self.server.health()).encode(), "application/json")
+        elif self.path == "/metrics":
+            self.respond(
+                200,
+                # Recorded since the service started, rather than per render
+                metrics.prometheus("since the service started").encode(),
+                "text/plain; version=0.0.4",
+            )
+        else:
+            self.error(404, "Not found")
+
+    def do_POST(self) -> None:
+        routes = {"/image": self.server.render_image, "/card": self.server.render_card}
+
+        if self.path not in routes:
+            self.error(404, "Not found")
+            return
+
+        metrics.increment("service_requests")
+
+        try:
+            try:
+                length = int(self.headers["Content-Length"])
+            except (TypeError, ValueError):
+                length = -1
+
+            # Reading a negative length would wait for the client to disconnect
+            if length < 0:
+                raise RenderError(400, "Missing or invalid Content-Length")
+            if length > MAX_BODY:
+                raise RenderError(413, "Request too large")
+
+            try:
+                request = json.loads(self.rfile.read(length))
+            except ValueError:
+                raise RenderError(400, "Invalid JSON")
+
+            if not isinstance(request, dict):
+                raise RenderError(400, "Invalid JSON")
+
+            with metrics.timer(f"service_{self.path[1:]}"):
+                data, extension = routes[self.path](request)
+        except RenderError as error:
+            metrics.increment("service_errors")
+            self.error(error.status, str(error))
+            return
+        except Exception as error:
+            log.error(f"Failed to render {self.path}, {error}")
+            metrics.increment("service_errors")
+            self.error(500, "Failed to render")
+            return
+
+        self.respond(200, data, CONTENT_TYPES[extension])
+
+    def error(self, status: int, message: str) -> None:
+        headers = {"Retry-After": "1"} if status == 503 else {}
+        self.respond(
+            status, json.dumps({"error": message}).encode(), "application/json", headers)
+
+    def respond(self, status: int, content: bytes, content_type: str,
+                headers: dict = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def serve(host: str = None, port: int = None) -> None:
+    """Serve render requests until interrupted."""
+    service = RenderService(
+        host or Config.SERVICE_HOST,
+        port or Config.SERVICE_PORT,
+        Config.SERVICE_WORKERS,
+        Config.SERVICE_QUEUE_TIMEOUT,
+    )
+    metrics.reset()
+
+    log.info(
+        f"Serving renders on http://{service.server_address[0]}:{service.server_address[1]} "
+        f"with {service.workers} workers"
+    )
+
+    try:
+        service.serve_forever()
+    finally:
+        service.server_close()
+        # Cards rendered on their own are only stored with the next image
+        service.athena.save_caches()
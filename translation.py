@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+from metrics import metrics
+from util import Utility
+
+log = logging.getLogger(__name__)
+
+
+class Translation:
+    """
+    Translate the texts drawn on the Item Shop image.
+
+    Texts are served from the table bundled in `assets/translations.json`,
+    anything missing is translated once with googletrans and then kept in
+    the cache file found at `cache_path`.
+    """
+
+    def __init__(self, cache_path: str = None):
+        self.cache_path = cache_path
+        # Leave anything missing from the table and the cache untranslated
+        self.offline = False
+
+        with open("assets/translations.json", "r", encoding="utf-8") as file:
+            self.table = json.load(file)
+
+        self.cache = {}
+        if cache_path is not None:
+            try:
+                with open(cache_path, "r", encoding="utf-8") as file:
+                    self.cache = json.load(file)
+            except FileNotFoundError:
+                pass
+            except Exception as error:
+                log.warning(f"Failed to read translation cache, {error}")
+
+    def language_table(self, language: str):
+        """Return the bundled table of the provided language, None if missing."""
+        language = language.lower().replace("_", "-")
+
+        # Regional variants fall back to the base language, pt-BR to pt
+        return self.table.get(language, self.table.get(language.split("-")[0]))
+
+    def text(self, text: str, language: str) -> str:
+        """Return the provided English text translated in the specified language."""
+        table = self.language_table(language)
+
+        if table is not None and text in table:
+            return table[text]
+
+        return self.fallback(text, language)
+
+    def date(self, date: str, language: str) -> str:
+        """Return the provided ISO8601 date in human-readable format, translated."""
+        table = self.language_table(language)
+
+        if table is None:
+            return self.fallback(Utility().iso_to_human(date), language)
+
+        date = datetime.strptime(date, "%Y-%m-%d")
+        return table["date"].format(
+            weekday=table["weekdays"][date.weekday()],
+            day=date.day,
+            month=table["months"][date.month - 1],
+            year=date.year,
+        )
+
+    def fallback(self, text: str, language: str) -> str:
+        """
+        Return the provided text translated with googletrans, only the first
+        time it is requested. Return the text untranslated on failure.
+        """
+        cached = self.cache.get(language, {})
+
+        if text in cached:
+            return cached[text]
+
+        if self.offline is True:
+            log.warning(f"{text} is not translated in {language}, unavailable offline")
+            return text
+
+        metrics.increment("translation_requests")
+
+        try:
+            from googletrans import Translator
+
+            translated = Translator().translate(text, src="en", dest=language).text
+        except Exception as error:
+            log.warning(f"Failed to translate {text} in {language}, {error}")
+            return text
+
+        self.cache.setdefault(language, {})[text] = translated
+        self.save()
+
+        return translated
+
+    def save(self) -> None:
+        """Write the translation cache to disk."""
+        if self.cache_path is None:
+            return
+
+        try:
+            with open(f"{self.cache_path}.tmp", "w", encoding="utf-8") as file:
+                json.dump(self.cache, file, ensure_ascii=False)
+            os.replace(f"{self.cache_path}.tmp", self.cache_path)
+        except Exception as error:
+            log.warning(f"Failed to save translation cache, {error}")
@@ -1,31 +1,58 @@
+import hashlib
+import json
 import logging
+import os
+import threading
 from datetime import datetime
+from io import BytesIO
 
-import requests
 from PIL import Image, ImageFont
 
+from cache import IconCache
+from metrics import metrics
+from network import http
+from pack import AssetPack
+
 log = logging.getLogger(__name__)
 
+# Should be outdated
+BLEND_COLORS = {
+    "frozen": (148, 223, 255),
+    "lava": (234, 141, 35),
+    "legendary": (211, 120, 65),
+    "dark": (251, 34, 223),
+    "starwars": (231, 196, 19),
+    "marvel": (197, 51, 52),
+    "dc": (84, 117, 199),
+    "icon": (54, 183, 183),
+    "shadow": (113, 113, 113),
+    "epic": (177, 91, 226),
+    "rare": (73, 172, 242),
+    "uncommon": (96, 170, 58),
+    "common": (190, 190, 190),
+}
 
-class Utility:
-    """Class containing utilitarian functions intended to reduce duplicate code."""
+CARD_SIZE = (300, 545)
 
-    @staticmethod
-    def get_url(url: str, parameters=None):
-        """
-        Return the response of a successful HTTP GET request to the specified
-        URL with the optionally provided header values.
-        """
+FONT = "assets/fonts/BurbankBigCondensed-Black.otf"
 
-        if parameters is None:
-            parameters = {"language": "en"}
-        res = requests.get(url, params=parameters)
+# Part of the card store version, bumped whenever cards render differently
+CARD_VERSION = 3
 
-        # HTTP 200 (OK)
-        if res.status_code == 200:
-            return res.json()
-        else:
-            log.critical(f"Failed to GET {url} (HTTP {res.status_code})")
+# Resampling of the downscaled icons, part of the variant store keys
+DOWNSCALE = "lanczos-reduce2-gap3"
+
+# Text widths kept for the next runs, the least recently used are forgotten
+# first so that the names of items which left the Item Shop do not pile up
+WIDTHS_MAX = 10000
+
+# Modes of the icons which can be box-reduced, Image.reduce rejects the
+# others such as palette, bilevel and 16 bits images
+REDUCE_MODES = {"L", "LA", "RGB", "RGBA", "CMYK", "YCbCr", "I", "F"}
+
+
+class Utility:
+    """Class containing utilitarian functions intended to reduce duplicate code."""
 
     @staticmethod
     def iso_to_human(date: str):
@@ -46,22 +73,206 @@ class Utility:
 class ImageUtil:
     """Class containing utilitarian image-based functions intended to reduce duplicate code."""
 
+    # Decoded assets, shared by every instance for the lifetime of the process
+    layers: dict = {}
+    templates: dict = {}
+    vbucks: dict = {}
+    fonts: dict = {}
+    # Ordered from the least recently used
+    widths: dict = {}
+    widths_lock = threading.Lock()
+    # Asset packs of the styles, by style
+    packs: dict = {}
+
     @staticmethod
     def open_image(filename: str):
         """Return the specified image file."""
         return Image.open(f"assets/images/{filename}")
 
+    def open_layer(self, filename: str):
+        """
+        Return the specified image file decoded as RGBA, decoding it only the
+        first time it is requested. The returned image is shared, do not modify it.
+        """
+        if filename not in self.layers:
+            pack = next((pack for pack in self.packs.values() if filename in pack), None)
+
+            if pack is not None:
+                self.layers[filename] = pack.layer(filename)
+                metrics.increment("packed_layers")
+            else:
+                self.layers[filename] = self.open_image(filename).convert("RGBA")
+        return self.layers[filename]
+
+    def load_pack(self, style: str, directory: str) -> bool:
+        """
+        Open the layers of the provided style from its pack found in
+        `directory` rather than from their files. Return True if the pack is
+        up to date.
+        """
+        if style not in self.packs:
+            pack = AssetPack.open(os.path.join(directory, f"{style}.pack"), style, BLEND_COLORS)
+
+            if pack is None:
+                return False
+
+            self.packs[style] = pack
+
+        return True
+
+    def open_rarity_layer(self, style: str, layer: str, rarity: str):
+        """Return the specified layer of the provided rarity, defaulting to Common."""
+        filename = f"{style}/{layer}_{rarity}.png"
+
+        if filename not in self.layers:
+            try:
+                self.open_layer(filename)
+            except FileNotFoundError:
+                log.warning(
+                    f"Failed to open {layer}_{rarity}.png, defaulted to Common")
+                self.layers[filename] = self.open_layer(
+                    f"{style}/{layer}_common.png")
+
+        return self.layers[filename]
+
+    def card_template(self, style: str, rarity: str):
+        """
+        Return the frame of a card for the provided rarity as a (base, frame)
+        tuple. The item icons are pasted onto a copy of base, then every
+        layer of frame in order, through its own alpha.
+        The returned images are shared, do not modify them.
+        """
+        key = (style, rarity)
+
+        if key not in self.templates:
+            base = Image.new("RGBA", CARD_SIZE)
+            base.paste(self.open_rarity_layer(style, "card_top", rarity))
+
+            frame = [self.open_rarity_layer(style, "card_bottom", rarity)]
+            if style == "old":
+                frame.insert(0, self.open_rarity_layer(
+                    style, "card_faceplate", rarity))
+
+            self.templates[key] = (base, frame)
+
+        return self.templates[key]
+
+    def vbucks_icon(self, style: str):
+        """Return the V-Bucks icon scaled for the cards of the provided style."""
+        if style not in self.vbucks:
+            if style == "old":
+                icon = self.resize_ratio(self.open_layer("vbucks.png"), 25, 25)
+            else:
+                icon = self.resize_ratio(
+                    self.open_layer("vbucks_card.png"), 49, 49)
+            self.vbucks[style] = icon
+
+        return self.vbucks[style]
+
     @staticmethod
-    def download_image(url: str):
-        """Download and return the raw file from the specified url as an image object."""
-        res = requests.get(url, stream=True)
+    def assets_version():
+        """Return a digest which changes whenever a file in assets/ does."""
+        digest = hashlib.sha1()
+
+        for root, directories, files in os.walk("assets"):
+            directories.sort()
+            for filename in sorted(files):
+                stat = os.stat(os.path.join(root, filename))
+                digest.update(
+                    f"{root}/{filename}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+
+        return digest.hexdigest()
+
+    def blend_color(self, rarity: str):
+        """Return the text color of the provided rarity."""
+        for pack in self.packs.values():
+            return pack.blend_colors.get(rarity, (255, 255, 255))
 
+        return BLEND_COLORS.get(rarity, (255, 255, 255))
+
+    @staticmethod
+    @metrics.timed("download")
+    def download_file(url: str, cache: IconCache = None):
+        """
+        Download and return the raw file from the specified url.
+
+        When provided, `cache` is revalidated instead of downloading the file again.
+        """
+        if cache is not None:
+            return cache.fetch(url)
+
+        res = http.get(url)
+
+        if res is None:
+            log.critical(f"Failed to GET {url}")
         # HTTP 200 (OK)
-        if res.status_code == 200:
-            return Image.open(res.raw)
+        elif res.status_code == 200:
+            return res.content
         else:
             log.critical(f"Failed to GET {url} (HTTP {res.status_code})")
 
+    @staticmethod
+    @metrics.timed("decode")
+    def decode_image(content: bytes, size: tuple = None):
+        """
+        Return the provided raw file as a fully decoded image object. When
+        provided, formats which support it (JPEG) are decoded at the smallest
+        scale which is still larger than `size`.
+        """
+        image = Image.open(BytesIO(content))
+        if size is not None:
+            image.draft(image.mode, size)
+        image.load()
+        return image
+
+    def downscale_icon(self, content: bytes, width: int, height: int, rgba: bool = False):
+        """
+        Return the provided raw icon decoded and resized to fill `width` and
+        `height`, converted to RGBA first when `rgba` is True.
+        """
+        icon = self.decode_image(content, (width, height))
+        if rgba is True:
+            icon = icon.convert("RGBA")
+
+        ratio = max(width / icon.width, height / icon.height)
+        size = (int(icon.width * ratio), int(icon.height * ratio))
+
+        if icon.mode not in REDUCE_MODES:
+            # Resized as is, the palette and bilevel ones with the nearest
+            # neighbour
+            return icon.resize(size, Image.ANTIALIAS)
+
+        # Image.resize ignores the reducing gap of RGBA images, resize them
+        # premultiplied as it would
+        mode = icon.mode
+        if mode == "RGBA":
+            icon = icon.convert("RGBa")
+
+        # Icons shrunk at least twice, such as the 1024 pixels featured
+        # icons, are box-reduced by 2 first so that the filter only reads a
+        # quarter of the pixels
+        if min(icon.width / size[0], icon.height / size[1]) >= 2:
+            icon = icon.reduce(2)
+
+        # Also box-reduces by an integer factor first when shrinking at
+        # least three times more, then filters the rest of the reduction
+        icon = icon.resize(size, Image.ANTIALIAS, reducing_gap=3.0)
+
+        return icon.convert(mode) if icon.mode != mode else icon
+
+    def download_image(self, url: str, cache: IconCache = None):
+        """Download and return the raw file from the specified url as an image object."""
+        content = self.download_file(url, cache)
+
+        if content is not None:
+            return self.decode_image(content)
+
+    @staticmethod
+    def placeholder_icon():
+        """Return the image drawn in place of an icon which is unavailable."""
+        # Transparent, the card background and the item name remain
+        return Image.new("RGBA", (512, 512))
+
     @staticmethod
     def resize_ratio(image: Image.Image, max_width: int, max_height: int):
         """Resize and return the provided image while maintaining aspect ratio."""
@@ -76,13 +287,74 @@ class ImageUtil:
         """Return the tuple necessary for horizontal centering and an optional vertical distance."""
         return background_width // 2 - foreground_width // 2, distance_top
 
-    @staticmethod
-    def get_font(size: int):
+    def get_font(self, size: int):
         """
         :size -> font size of text
         :return -> A font object with the specified font file and size.
         """
-        return ImageFont.truetype(f"assets/fonts/BurbankBigCondensed-Black.otf", size)
+        key = (FONT, size)
+
+        if key not in self.fonts:
+            self.fonts[key] = ImageFont.truetype(FONT, size)
+        return self.fonts[key]
+
+    def text_width(self, text: str, size: int):
+        """Return the width of the provided text at the specified font size."""
+        key = f"{size}|{text}"
+        width = self.widths.get(key)
+
+        if width is None:
+            width, _ = self.get_font(size).getsize(text)
+
+        with self.widths_lock:
+            # Moved last, as the most recently used
+            self.widths.pop(key, None)
+            self.widths[key] = width
+
+            if len(self.widths) > WIDTHS_MAX:
+                del self.widths[next(iter(self.widths))]
+
+        return width
+
+    def load_widths(self, path: str) -> None:
+        """Load the text widths measured by previous runs, unless the font changed."""
+        try:
+            with open(path, "r") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return
+        except Exception as error:
+            log.warning(f"Failed to read text widths, {error}")
+            return
+
+        if data.get("font") != self.font_signature():
+            return
+
+        with self.widths_lock:
+            for key, width in data["widths"].items():
+                self.widths.setdefault(key, width)
+
+            while len(self.widths) > WIDTHS_MAX:
+                del self.widths[next(iter(self.widths))]
+
+    def save_widths(self, path: str) -> None:
+        """Write the measured text widths to disk for the next runs, at most WIDTHS_MAX."""
+        # Copied, texts may be measured meanwhile by concurrent renders
+        with self.widths_lock:
+            data = {"font": self.font_signature(), "widths": dict(self.widths)}
+
+        try:
+            with open(f"{path}.tmp", "w") as file:
+                json.dump(data, file)
+            os.replace(f"{path}.tmp", path)
+        except Exception as error:
+            log.warning(f"Failed to save text widths, {error}")
+
+    @staticmethod
+    def font_signature():
+        """Return a string which changes whenever the font file does."""
+        stat = os.stat(FONT)
+        return f"{FONT}:{stat.st_size}:{stat.st_mtime_ns}"
 
     def fit_text(self, text: str, size: int, max_size: int):
         """
@@ -94,14 +366,19 @@ class ImageUtil:
         :max_size -> max width size per pixel
         :return -> font object + new text width + change int to align the text
         """
-        font = self.get_font(size)
-        text_width, _ = font.getsize(text)
-        change = 0
+        text_width = self.text_width(text, size)
+
+        if text_width < max_size:
+            return self.get_font(size), text_width, 0
 
-        while text_width >= max_size:
-            change += 1
-            size -= 1
-            font = self.get_font(size)
-            text_width, _ = font.getsize(text)
+        # Text width grows with the font size, binary search the largest
+        # size which fits instead of shrinking one point at a time
+        low, high = 1, size
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.text_width(text, middle) >= max_size:
+                high = middle
+            else:
+                low = middle
 
-        return font, text_width, change
+        return self.get_font(low), self.text_width(text, low), size - low